@@ -1,26 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Request
+from fastapi.responses import StreamingResponse, Response
+from typing import List
+from fastapi.concurrency import run_in_threadpool
+import gzip
+import logging
 import os
-import shutil
-import tempfile
 import uuid
 
 from infrastructure.supabase_adapter import supabase_adapter
 from infrastructure.redis_adapter import redis_adapter
+from infrastructure.answer_cache import invalidate_answers
+from core.config import settings
 from core.security import get_current_user
+from core.workspace_access import get_owned_workspace, get_owned_workspace_fresh, workspace_cache
 from services.graph_service import GraphService
-from workers.tasks import process_document_task
+from workers.tasks import process_document_task, sync_entity_count
 from langgraph.query_graph import query_pipeline
+from models.schemas import BatchUploadResponse, GraphNodePage, GraphEdgePage
+from utils.hashing import sha256_upload
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/graph", tags=["graph"])
 
 @router.post("/{workspace_id}/upload")
-async def upload_and_process(workspace_id: str, file: UploadFile = File(...), user: dict = Depends(get_current_user)):
+async def upload_and_process(workspace_id: str, file: UploadFile = File(...), user: dict = Depends(get_current_user), workspace: dict = Depends(get_owned_workspace_fresh)):
     user_id = user["sub"]
-    
-    # Verify ownership
-    workspace = supabase_adapter.get_workspace(workspace_id, user_id)
-    if not workspace:
-        raise HTTPException(status_code=404, detail="Workspace not found or access denied")
         
     if workspace.get("doc_count", 0) >= 10:
         raise HTTPException(status_code=400, detail="Document limit reached (Max 10)")
@@ -29,25 +34,29 @@ async def upload_and_process(workspace_id: str, file: UploadFile = File(...), us
     unique_filename = f"{uuid.uuid4()}{ext}"
     storage_path = f"{workspace_id}/{unique_filename}"
 
-    # Save file temporarily to upload to Supabase Storage
-    with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp:
-        shutil.copyfileobj(file.file, tmp)
-        tmp_path = tmp.name
+    # Hash the upload in chunks without blocking the event loop
+    try:
+        content_hash = await sha256_upload(file, settings.MAX_UPLOAD_BYTES)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    # Identical bytes already processed in this workspace: nothing to do
+    existing = supabase_adapter.find_document_by_hash(workspace_id, content_hash)
+    if existing:
+        return {"status": "completed", "job_id": existing.get("job_id"), "document_id": existing["id"], "duplicate": True}
 
     try:
-        # Upload to Supabase Storage
-        supabase_adapter.upload_file(tmp_path, storage_path)
+        # Upload to Supabase Storage straight from the request's spooled file, off the event loop
+        await file.seek(0)
+        await run_in_threadpool(supabase_adapter.upload_fileobj, file.file, storage_path)
     except Exception as e:
-        os.remove(tmp_path)
         raise HTTPException(status_code=500, detail=f"Failed to upload file to storage: {str(e)}")
-    
-    os.remove(tmp_path)
 
     # Note: the us  er requested document to have status='pending' and include a job_id.
     # We will generate a job ID prefix or let RQ generate it.
     
     # Store initial pending document row
-    document = supabase_adapter.create_document(user_id, workspace_id, file.filename, status="pending")
+    document = supabase_adapter.create_document(user_id, workspace_id, file.filename, status="pending", content_hash=content_hash, storage_path=storage_path)
     if not document:
         raise HTTPException(status_code=500, detail="Failed to create document record")
 
@@ -83,39 +92,178 @@ async def upload_and_process(workspace_id: str, file: UploadFile = File(...), us
 
     return {"status": "queued", "job_id": job.id, "document_id": document_id}
 
-@router.get("/{workspace_id}")
-async def get_graph(workspace_id: str, user: dict = Depends(get_current_user)):
+def _delete_uploaded(storage_paths: list[str]):
+    """Best-effort removal of files uploaded by a request that then failed."""
+    for storage_path in storage_paths:
+        try:
+            supabase_adapter.delete_file(storage_path)
+        except Exception as e:
+            logger.warning(f"Failed to delete orphaned upload {storage_path}: {e}")
+
+@router.post("/{workspace_id}/upload/batch", response_model=BatchUploadResponse)
+async def upload_batch(workspace_id: str, files: List[UploadFile] = File(...), user: dict = Depends(get_current_user), workspace: dict = Depends(get_owned_workspace_fresh)):
+    """
+    Uploads many files in one request. Documents are created with a single bulk insert
+    and their jobs are enqueued in one Redis pipeline under a shared batch id.
+    """
     user_id = user["sub"]
-    workspace = supabase_adapter.get_workspace(workspace_id, user_id)
-    if not workspace:
-        raise HTTPException(status_code=404, detail="Workspace not found or access denied")
-        
-    return GraphService.get_workspace_graph(workspace_id)
+
+    if len(files) > settings.MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many files in one batch (Max {settings.MAX_BATCH_FILES})")
+
+    # Hash everything first so duplicates are skipped before anything is uploaded
+    hashed = []
+    for file in files:
+        try:
+            hashed.append((file, await sha256_upload(file, settings.MAX_UPLOAD_BYTES)))
+        except ValueError as e:
+            raise HTTPException(status_code=413, detail=f"{file.filename}: {str(e)}")
+
+    hashes = {h for _, h in hashed}
+    existing = supabase_adapter.find_documents_by_hashes(workspace_id, list(hashes))
+
+    # Only distinct content not yet in the workspace becomes a new document
+    if workspace.get("doc_count", 0) + len(hashes - existing.keys()) > 10:
+        raise HTTPException(status_code=400, detail="Document limit reached (Max 10)")
+
+    batch_id = str(uuid.uuid4())
+    rows, job_specs, duplicates = [], [], []
+    # content_hash -> id of the document created for its first file in this batch
+    seen = {}
+
+    for file, content_hash in hashed:
+        if content_hash in existing:
+            duplicates.append(existing[content_hash]["id"])
+            continue
+        if content_hash in seen:
+            duplicates.append(seen[content_hash])
+            continue
+
+        ext = os.path.splitext(file.filename)[1]
+        storage_path = f"{workspace_id}/{uuid.uuid4()}{ext}"
+        try:
+            await file.seek(0)
+            await run_in_threadpool(supabase_adapter.upload_fileobj, file.file, storage_path)
+        except Exception as e:
+            await run_in_threadpool(_delete_uploaded, [r["storage_path"] for r in rows])
+            raise HTTPException(status_code=500, detail=f"Failed to upload {file.filename} to storage: {str(e)}")
+
+        # Ids are assigned up front so rows and jobs can be written in bulk
+        document_id, job_id = str(uuid.uuid4()), str(uuid.uuid4())
+        seen[content_hash] = document_id
+        rows.append({
+            "id": document_id, "user_id": user_id, "workspace_id": workspace_id,
+            "file_name": file.filename, "status": "queued", "job_id": job_id,
+            "content_hash": content_hash, "batch_id": batch_id, "storage_path": storage_path
+        })
+        job_specs.append({
+            "job_id": job_id,
+            "kwargs": {
+                "job_id": job_id,
+                "workspace_id": workspace_id,
+                "user_id": user_id,
+                "document_id": document_id,
+                "storage_path": storage_path,
+                "ext": ext
+            }
+        })
+
+    if rows:
+        try:
+            supabase_adapter.create_documents(rows)
+        except Exception as e:
+            await run_in_threadpool(_delete_uploaded, [r["storage_path"] for r in rows])
+            raise HTTPException(status_code=500, detail=f"Failed to create document records: {str(e)}")
+
+        try:
+            redis_adapter.enqueue_many(process_document_task, job_specs, meta={"batch_id": batch_id})
+        except Exception as e:
+            await run_in_threadpool(_delete_uploaded, [r["storage_path"] for r in rows])
+            supabase_adapter.update_batch_status(batch_id, status="failed", error=f"Queue error: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Failed to queue processing jobs: {str(e)}")
+
+    return BatchUploadResponse(
+        batch_id=batch_id,
+        status="queued" if rows else "completed",
+        document_ids=[r["id"] for r in rows],
+        job_ids=[r["job_id"] for r in rows],
+        duplicate_document_ids=duplicates
+    )
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+async def graph_snapshot_response(request: Request, workspace_id: str):
+    """
+    Serves the workspace graph from the versioned snapshot cache. The graph version is the
+    ETag, so a client holding the current version gets a 304 without touching Neo4j.
+    """
+    version = await run_in_threadpool(GraphService.graph_version, workspace_id)
+    if version is None:
+        return await run_in_threadpool(GraphService.get_workspace_graph, workspace_id)
+
+    etag = f'"graph-{version}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+    if _etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+
+    snapshot = await run_in_threadpool(GraphService.get_graph_snapshot, workspace_id, version)
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        return Response(snapshot, media_type="application/json", headers={**headers, "Content-Encoding": "gzip"})
+    return Response(gzip.decompress(snapshot), media_type="application/json", headers=headers)
+
+@router.get("/{workspace_id}")
+async def get_graph(workspace_id: str, request: Request, workspace: dict = Depends(get_owned_workspace)):
+    return await graph_snapshot_response(request, workspace_id)
+
+def _page_limit(limit: int = None) -> int:
+    return min(limit or settings.GRAPH_PAGE_SIZE, settings.GRAPH_PAGE_MAX)
+
+@router.get("/{workspace_id}/nodes", response_model=GraphNodePage)
+async def get_graph_nodes(workspace_id: str, cursor: str = None, limit: int = Query(None, ge=1), workspace: dict = Depends(get_owned_workspace)):
+    try:
+        return await run_in_threadpool(GraphService.get_nodes_page, workspace_id, cursor, _page_limit(limit))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{workspace_id}/edges", response_model=GraphEdgePage)
+async def get_graph_edges(workspace_id: str, cursor: str = None, limit: int = Query(None, ge=1), workspace: dict = Depends(get_owned_workspace)):
+    try:
+        return await run_in_threadpool(GraphService.get_edges_page, workspace_id, cursor, _page_limit(limit))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{workspace_id}/export")
+async def export_graph(workspace_id: str, workspace: dict = Depends(get_owned_workspace)):
+    """Streams the whole graph as NDJSON: one {"type": "node"|"edge", ...} object per line."""
+    # A sync generator: Starlette pulls each page from Neo4j in the threadpool
+    return StreamingResponse(
+        GraphService.export_graph_ndjson(workspace_id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="graph-{workspace_id}.ndjson"'}
+    )
 
 @router.put("/{workspace_id}/entity")
-async def edit_entity(workspace_id: str, old_name: str, new_name: str, new_type: str, new_desc: str, user: dict = Depends(get_current_user)):
-    user_id = user["sub"]
-    workspace = supabase_adapter.get_workspace(workspace_id, user_id)
-    if not workspace:
-        raise HTTPException(status_code=404, detail="Workspace not found or access denied")
-        
+async def edit_entity(workspace_id: str, old_name: str, new_name: str, new_type: str, new_desc: str, workspace: dict = Depends(get_owned_workspace)):
     try:
         GraphService.edit_entity(workspace_id, old_name, new_name, new_type, new_desc)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    invalidate_answers(workspace_id)
     return {"status": "success"}
 
 @router.post("/{workspace_id}/merge")
-async def merge_entities(workspace_id: str, keep: str, delete: str, user: dict = Depends(get_current_user)):
+async def merge_entities(workspace_id: str, keep: str, delete: str, user: dict = Depends(get_current_user), workspace: dict = Depends(get_owned_workspace)):
     user_id = user["sub"]
-    workspace = supabase_adapter.get_workspace(workspace_id, user_id)
-    if not workspace:
-        raise HTTPException(status_code=404, detail="Workspace not found or access denied")
-        
     try:
         GraphService.merge_entities(workspace_id, keep, delete)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    # The merged-away entity no longer exists
+    await run_in_threadpool(sync_entity_count, workspace_id, user_id)
+    workspace_cache.invalidate(workspace_id)
+    invalidate_answers(workspace_id)
     return {"status": "success"}
 
 
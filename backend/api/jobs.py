@@ -1,10 +1,46 @@
 from fastapi import APIRouter, Depends, HTTPException
 from core.security import get_current_user
 from infrastructure.supabase_adapter import supabase_adapter
-from models.schemas import JobResponse
+from models.schemas import JobResponse, BatchStatusResponse, BatchDocumentStatus
 
 router = APIRouter(prefix="/jobs", tags=["jobs"])
 
+@router.get("/batch/{batch_id}", response_model=BatchStatusResponse)
+async def get_batch_status(batch_id: str, user: dict = Depends(get_current_user)):
+    user_id = user["sub"]
+
+    documents = supabase_adapter.get_batch_documents(batch_id, user_id)
+    if not documents:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    counts = {}
+    for d in documents:
+        counts[d["status"]] = counts.get(d["status"], 0) + 1
+
+    finished = counts.get("completed", 0) + counts.get("failed", 0)
+    if finished < len(documents):
+        status = "processing" if counts.get("processing") or finished else "queued"
+    else:
+        status = "failed" if counts.get("failed") else "completed"
+
+    return BatchStatusResponse(
+        batch_id=batch_id,
+        status=status,
+        total=len(documents),
+        counts=counts,
+        progress=finished / len(documents),
+        documents=[
+            BatchDocumentStatus(
+                document_id=d["id"],
+                file_name=d["file_name"],
+                status=d.get("status", "unknown"),
+                job_id=d.get("job_id"),
+                error=d.get("error")
+            )
+            for d in documents
+        ]
+    )
+
 @router.get("/{job_id}", response_model=JobResponse)
 async def get_job_status(job_id: str, user: dict = Depends(get_current_user)):
     user_id = user["sub"]
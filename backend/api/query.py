@@ -1,20 +1,41 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from core.compute import ComputeOverloaded, compute_pool
 from core.security import get_current_user
-from infrastructure.supabase_adapter import supabase_adapter
+from core.workspace_access import require_workspace
+from infrastructure.embedding_provider import embedding_provider
+from infrastructure.answer_cache import answer_cache
 from models.schemas import QueryRequest, QueryResponse
-from langgraph.query_graph import query_pipeline
+from langgraph.query_graph import query_pipeline, retrieval_pipeline, assemble_context, is_cacheable
+from services.nlp_service import NLPService
+import json
 import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["query"])
 
+async def lookup_cached_answer(workspace_id: str, query: str):
+    """
+    Returns (cached response or None, store callback). The query embedding computed here is
+    kept by the embedding cache, so the vector retrieval stage does not recompute it.
+    """
+    if not answer_cache:
+        return None, None
+
+    query_embedding = await compute_pool.run(embedding_provider.generate_query_embedding, query)
+    cached, generation = await run_in_threadpool(answer_cache.lookup, workspace_id, query, query_embedding)
+
+    def store(response: dict):
+        answer_cache.store(workspace_id, generation, query, query_embedding, response)
+
+    return cached, store
+
 @router.post("/query", response_model=QueryResponse)
 async def execute_query(request: QueryRequest, user: dict = Depends(get_current_user)):
     user_id = user["sub"]
-    workspace = supabase_adapter.get_workspace(request.workspace_id, user_id)
-    if not workspace:
-        raise HTTPException(status_code=404, detail="Workspace not found")
+    await require_workspace(user_id, request.workspace_id)
         
     initial_state = {
         "workspace_id": request.workspace_id,
@@ -24,11 +45,84 @@ async def execute_query(request: QueryRequest, user: dict = Depends(get_current_
     logger.info(f"Initial state: {initial_state}")
     
     try:
-        final_state = query_pipeline.invoke(initial_state)
+        cached, store_answer = await lookup_cached_answer(request.workspace_id, request.query)
+        if cached:
+            return QueryResponse(**cached, cached=True)
+
+        final_state = await query_pipeline.ainvoke(initial_state)
         # Using the new schema format
-        return QueryResponse(
+        response = QueryResponse(
             answer=final_state.get("answer", "No answer generated."),
             sources=final_state.get("sources", [])
         )
+        # Never cache an answer built from a failed step or from no context at all
+        if store_answer and is_cacheable(final_state):
+            await run_in_threadpool(store_answer, {"answer": response.answer, "sources": [s.model_dump() for s in response.sources]})
+        return response
+    except ComputeOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to execute query: {str(e)}")
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_query_events(initial_state: dict):
+    """
+    Emits a `stage` event as each retrieval node finishes, then `token` events while
+    the answer streams, then `sources` and `done`. Failures are reported as an `error` event.
+    """
+    try:
+        cached, store_answer = await lookup_cached_answer(initial_state["workspace_id"], initial_state["query"])
+        if cached:
+            yield sse_event("stage", {"stage": "answer_cache", "cached": True})
+            yield sse_event("token", {"text": cached["answer"]})
+            yield sse_event("sources", cached["sources"])
+            yield sse_event("done", {"cached": True})
+            return
+
+        state = dict(initial_state, errors=[])
+        async for update in retrieval_pipeline.astream(initial_state, stream_mode="updates"):
+            for stage, values in update.items():
+                values = dict(values or {})
+                # Updates carry each node's own errors; accumulate them like the graph's reducer
+                state["errors"] += values.pop("errors", [])
+                state.update(values)
+                yield sse_event("stage", {"stage": stage})
+
+        merged, sources = assemble_context(state)
+
+        answer = []
+        async for token in NLPService.astream_rag_response(state["query"], merged):
+            answer.append(token)
+            yield sse_event("token", {"text": token})
+
+        yield sse_event("sources", sources)
+        yield sse_event("done", {"cached": False})
+
+        # A failed stream raises before this point, so only retrieval needs checking
+        if store_answer and is_cacheable(state):
+            await run_in_threadpool(store_answer, {"answer": "".join(answer), "sources": sources})
+
+    except ComputeOverloaded as e:
+        yield sse_event("error", {"status": 503, "detail": str(e)})
+    except Exception as e:
+        logger.error(f"Streaming query failed: {e}")
+        yield sse_event("error", {"status": 500, "detail": f"Failed to execute query: {str(e)}"})
+
+@router.post("/query/stream")
+async def execute_query_stream(request: QueryRequest, user: dict = Depends(get_current_user)):
+    """Server-sent-events variant of /query for low time-to-first-token."""
+    user_id = user["sub"]
+    await require_workspace(user_id, request.workspace_id)
+
+    initial_state = {
+        "workspace_id": request.workspace_id,
+        "query": request.query
+    }
+
+    return StreamingResponse(
+        stream_query_events(initial_state),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,9 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request
+from fastapi.concurrency import run_in_threadpool
+from postgrest.exceptions import APIError
 from typing import List
+import logging
+import os
+import uuid
 from models.schemas import WorkspaceCreate, WorkspaceResponse, DocumentResponse
 from infrastructure.supabase_adapter import supabase_adapter
+from infrastructure.redis_adapter import redis_adapter
+from infrastructure.answer_cache import invalidate_answers
+from core.config import settings
 from core.security import get_current_user
-from services.graph_service import GraphService
+from core.workspace_access import NO_ROWS, get_owned_workspace, get_owned_workspace_fresh, workspace_cache
+from utils.hashing import sha256_upload
+from workers.tasks import process_document_task, remove_document_data, sync_entity_count
+from api.graph import graph_snapshot_response
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/workspaces", tags=["workspaces"])
 
@@ -13,11 +26,8 @@ async def list_workspaces(user: dict = Depends(get_current_user)):
     return supabase_adapter.get_workspaces(user_id)
 
 @router.get("/{workspace_id}", response_model=WorkspaceResponse)
-async def get_workspace(workspace_id: str, user: dict = Depends(get_current_user)):
-    user_id = user["sub"]
-    workspace = supabase_adapter.get_workspace(workspace_id, user_id)
-    if not workspace:
-        raise HTTPException(status_code=404, detail="Workspace not found")
+async def get_workspace(workspace_id: str, workspace: dict = Depends(get_owned_workspace_fresh)):
+    # Always re-read: this is where clients see the current document and entity counts
     return workspace
 
 @router.get("/{workspace_id}/documents", response_model=List[DocumentResponse])
@@ -28,15 +38,143 @@ async def get_workspace_documents(workspace_id: str, user: dict = Depends(get_cu
         return []
     return documents
 
+def _get_workspace_document(workspace_id: str, document_id: str):
+    try:
+        document = supabase_adapter.get_document(document_id)
+    except APIError as e:
+        if e.code != NO_ROWS:
+            raise
+        document = None
+    if not document or document.get("workspace_id") != workspace_id:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if document.get("status") in ("queued", "processing"):
+        raise HTTPException(status_code=409, detail="Document is still being processed")
+    return document
+
+def _queue_document_job(workspace_id: str, user_id: str, document_id: str, storage_path: str, ext: str, job_id: str, count_document: bool = False):
+    redis_adapter.enqueue_many(process_document_task, [{
+        "job_id": job_id,
+        "kwargs": {
+            "job_id": job_id,
+            "workspace_id": workspace_id,
+            "user_id": user_id,
+            "document_id": document_id,
+            "storage_path": storage_path,
+            "ext": ext,
+            "replace": True,
+            "count_document": count_document
+        }
+    }])
+
+def _reingest_duplicates(workspace_id: str, user_id: str, document_id: str):
+    """
+    Duplicates of a document hold no data of their own, so once it is deleted or replaced
+    the oldest one is re-ingested and the others are pointed at it.
+    """
+    duplicates = supabase_adapter.get_duplicates_of(document_id)
+    if not duplicates:
+        return
+    successor = duplicates[0]
+    for duplicate in duplicates[1:]:
+        supabase_adapter.update_document(duplicate["id"], {"duplicate_of": successor["id"]})
+
+    storage_path = successor.get("storage_path")
+    if not storage_path:
+        supabase_adapter.update_document(successor["id"], {
+            "status": "failed", "duplicate_of": None, "error": "Original document was removed; upload this file again"
+        })
+        supabase_adapter.increment_workspace_stats(workspace_id, user_id, doc_delta=-1)
+        return
+
+    job_id = str(uuid.uuid4())
+    supabase_adapter.update_document(successor["id"], {
+        "status": "queued", "job_id": job_id, "duplicate_of": None, "error": None
+    })
+    try:
+        _queue_document_job(workspace_id, user_id, successor["id"], storage_path, os.path.splitext(storage_path)[1], job_id)
+    except Exception as e:
+        supabase_adapter.update_document_job(successor["id"], status="failed", error=f"Queue error: {str(e)}")
+        logger.error(f"Failed to re-ingest duplicate {successor['id']} of {document_id}: {e}")
+        return
+    logger.info(f"Re-ingesting {successor['id']}, which duplicated {document_id}")
+
+@router.delete("/{workspace_id}/documents/{document_id}")
+async def delete_document(workspace_id: str, document_id: str, user: dict = Depends(get_current_user), workspace: dict = Depends(get_owned_workspace)):
+    """Deletes one document: its chunks, the graph elements only it contributed, its file and its row."""
+    user_id = user["sub"]
+    document = _get_workspace_document(workspace_id, document_id)
+
+    removed = await run_in_threadpool(remove_document_data, workspace_id, document_id)
+
+    if document.get("storage_path"):
+        try:
+            supabase_adapter.delete_file(document["storage_path"])
+        except Exception as e:
+            logger.warning(f"Failed to delete stored file for {document_id}: {e}")
+
+    supabase_adapter.delete_document(document_id)
+    _reingest_duplicates(workspace_id, user_id, document_id)
+    invalidate_answers(workspace_id)
+    if document.get("status") == "completed":
+        supabase_adapter.increment_workspace_stats(workspace_id, user_id, doc_delta=-1)
+    await run_in_threadpool(sync_entity_count, workspace_id, user_id)
+    workspace_cache.invalidate(workspace_id)
+    return {"status": "deleted", "document_id": document_id, **removed}
+
+@router.put("/{workspace_id}/documents/{document_id}/upload")
+async def replace_document(workspace_id: str, document_id: str, file: UploadFile = File(...), user: dict = Depends(get_current_user), workspace: dict = Depends(get_owned_workspace)):
+    """Replaces a document's file and re-ingests it; only this document's data is rebuilt."""
+    user_id = user["sub"]
+    document = _get_workspace_document(workspace_id, document_id)
+
+    try:
+        content_hash = await sha256_upload(file, settings.MAX_UPLOAD_BYTES)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    ext = os.path.splitext(file.filename)[1]
+    storage_path = f"{workspace_id}/{uuid.uuid4()}{ext}"
+    try:
+        await file.seek(0)
+        await run_in_threadpool(supabase_adapter.upload_fileobj, file.file, storage_path)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to upload file to storage: {str(e)}")
+
+    if document.get("storage_path"):
+        try:
+            supabase_adapter.delete_file(document["storage_path"])
+        except Exception as e:
+            logger.warning(f"Failed to delete previous file for {document_id}: {e}")
+
+    job_id = str(uuid.uuid4())
+    supabase_adapter.update_document(document_id, {
+        "file_name": file.filename,
+        "storage_path": storage_path,
+        "content_hash": content_hash,
+        "status": "queued",
+        "job_id": job_id,
+        "duplicate_of": None,
+        "error": None
+    })
+    _reingest_duplicates(workspace_id, user_id, document_id)
+
+    try:
+        # A document whose previous version never completed is not in doc_count yet
+        _queue_document_job(
+            workspace_id, user_id, document_id, storage_path, ext, job_id,
+            count_document=document.get("status") != "completed"
+        )
+    except Exception as e:
+        supabase_adapter.update_document_job(document_id, status="failed", error=f"Queue error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to queue processing job: {str(e)}")
+
+    return {"status": "queued", "job_id": job_id, "document_id": document_id}
+
 @router.post("/", response_model=WorkspaceResponse)
 async def create_workspace(workspace_data: WorkspaceCreate, user: dict = Depends(get_current_user)):
     user_id = user["sub"]
     return supabase_adapter.create_workspace(user_id, workspace_data.name)
 
 @router.get("/{workspace_id}/graph")
-async def get_workspace_graph(workspace_id: str, user: dict = Depends(get_current_user)):
-    user_id = user["sub"]
-    workspace = supabase_adapter.get_workspace(workspace_id, user_id)
-    if not workspace:
-        raise HTTPException(status_code=404, detail="Workspace not found")
-    return GraphService.get_workspace_graph(workspace_id)
+async def get_workspace_graph(workspace_id: str, request: Request, workspace: dict = Depends(get_owned_workspace)):
+    return await graph_snapshot_response(request, workspace_id)
@@ -0,0 +1,92 @@
+"""
+Benchmark: relationship write time vs relationship count.
+
+Compares the old per-relationship MATCH/MATCH/MERGE transaction against the
+batched UNWIND path in Neo4jAdapter.create_graph. Uses the NEO4J_* settings from
+.env and writes into a throwaway workspace that is deleted afterwards.
+
+    cd backend && python -m benchmarks.bench_rel_writes
+"""
+import random
+import time
+import uuid
+
+from infrastructure.neo4j_adapter import neo4j_adapter
+
+REL_COUNTS = [100, 500, 2000, 5000]
+REL_TYPES = ["part of", "related to", "causes", "uses", "located in"]
+
+
+def make_graph(n_rels: int):
+    n_entities = max(50, n_rels // 4)
+    entities = [
+        {"name": f"entity {i}", "type": "concept", "description": ""}
+        for i in range(n_entities)
+    ]
+    relationships = [
+        {
+            "source": f"entity {random.randrange(n_entities)}",
+            "target": f"entity {random.randrange(n_entities)}",
+            "type": random.choice(REL_TYPES)
+        }
+        for _ in range(n_rels)
+    ]
+    return entities, relationships
+
+
+def write_rels_per_statement(workspace_id: str, relationships: list):
+    """The pre-batching write path: one statement per relationship."""
+    def _create_rels_tx(tx, rels):
+        for rel in rels:
+            rel_type = neo4j_adapter.sanitize_rel_type(rel["type"])
+            tx.run(f"""
+                MATCH (a:Entity {{name: $source, workspace_id: $workspace_id}})
+                MATCH (b:Entity {{name: $target, workspace_id: $workspace_id}})
+                MERGE (a)-[r:{rel_type}]->(b)
+                SET r.workspace_id = $workspace_id
+                """, source=rel["source"], target=rel["target"], workspace_id=workspace_id)
+
+    with neo4j_adapter.driver.session(database=neo4j_adapter.database) as session:
+        session.execute_write(_create_rels_tx, relationships)
+
+
+def drop_workspace(workspace_id: str):
+    with neo4j_adapter.driver.session(database=neo4j_adapter.database) as session:
+        session.run("MATCH (e:Entity {workspace_id: $workspace_id}) DETACH DELETE e", workspace_id=workspace_id)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    if not neo4j_adapter.driver:
+        raise SystemExit("NEO4J_URI is not set")
+
+    neo4j_adapter.init_db()
+    print(f"{'rels':>8} {'per-statement (s)':>18} {'unwind (s)':>12} {'speedup':>8}")
+
+    for n_rels in REL_COUNTS:
+        entities, relationships = make_graph(n_rels)
+
+        old_ws = f"bench-{uuid.uuid4()}"
+        new_ws = f"bench-{uuid.uuid4()}"
+        try:
+            neo4j_adapter.create_graph(old_ws, entities, [])
+            old_time = timed(write_rels_per_statement, old_ws, relationships)
+
+            neo4j_adapter.create_graph(new_ws, entities, [])
+            new_time = timed(neo4j_adapter.create_graph, new_ws, [], relationships)
+        finally:
+            drop_workspace(old_ws)
+            drop_workspace(new_ws)
+
+        print(f"{n_rels:>8} {old_time:>18.3f} {new_time:>12.3f} {old_time / new_time:>7.1f}x")
+
+    neo4j_adapter.close()
+
+
+if __name__ == "__main__":
+    main()
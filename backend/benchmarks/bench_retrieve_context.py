@@ -0,0 +1,129 @@
+"""
+Benchmark: retrieve_context latency vs workspace size.
+
+Compares the old unindexed lookup (toLower(n.name) IN ... OR any(... CONTAINS ...))
+with the index-backed Neo4jAdapter.retrieve_context at 10k, 100k and 1M entities.
+Run it against a local, disposable Neo4j, not a shared database:
+
+    docker run --rm -d --name kg-bench -p 7687:7687 -e NEO4J_AUTH=neo4j/benchpass \\
+        -e NEO4J_server_memory_heap_max__size=2G neo4j:5
+    cd backend && NEO4J_URI=bolt://localhost:7687 NEO4J_USER=neo4j NEO4J_PASSWORD=benchpass \\
+        python -m benchmarks.bench_retrieve_context
+"""
+import argparse
+import random
+import statistics
+import time
+import uuid
+
+from infrastructure.neo4j_adapter import neo4j_adapter
+
+ENTITY_COUNTS = [10_000, 100_000, 1_000_000]
+WORDS = [
+    "neural", "network", "graph", "database", "protein", "market", "river", "engine",
+    "theory", "language", "model", "signal", "vector", "cell", "energy", "policy"
+]
+
+OLD_QUERY = """
+MATCH (n:Entity {workspace_id: $workspace_id})
+WHERE
+    toLower(n.name) IN $entity_names
+    OR any(name IN $entity_names WHERE toLower(n.name) CONTAINS name)
+
+OPTIONAL MATCH (n)-[r]-(m:Entity {workspace_id: $workspace_id})
+
+RETURN
+    n.name AS entity,
+    n.type AS type,
+    n.description AS description,
+    collect(DISTINCT {
+        rel: type(r),
+        connected_to: m.name
+    })[0..$limit] AS connections
+"""
+
+
+def entity_name(i: int) -> str:
+    rng = random.Random(i)
+    return f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}"
+
+
+def seed(workspace_id: str, n_entities: int, batch: int = 10_000):
+    for start in range(0, n_entities, batch):
+        ids = range(start, min(start + batch, n_entities))
+        entities = [{"name": entity_name(i), "type": "concept", "description": f"synthetic entity {i}"} for i in ids]
+        relationships = [
+            {"source": entity_name(i), "target": entity_name(random.randrange(start + 1)), "type": "related to"}
+            for i in ids
+        ]
+        neo4j_adapter.create_graph(workspace_id, entities, relationships)
+
+
+def drop_workspace(workspace_id: str):
+    with neo4j_adapter.driver.session(database=neo4j_adapter.database) as session:
+        session.run("""
+            MATCH (e:Entity {workspace_id: $workspace_id})
+            CALL { WITH e DETACH DELETE e } IN TRANSACTIONS OF 10000 ROWS
+        """, workspace_id=workspace_id).consume()
+
+
+def old_lookup(workspace_id: str, names: list[str]):
+    with neo4j_adapter.driver.session(database=neo4j_adapter.database) as session:
+        return session.run(OLD_QUERY, workspace_id=workspace_id, entity_names=names, limit=20).data()
+
+
+def new_lookup(workspace_id: str, names: list[str]):
+    return neo4j_adapter.retrieve_context(workspace_id, names, limit=20)
+
+
+def latencies(fn, workspace_id: str, queries: list[list[str]]) -> list[float]:
+    fn(workspace_id, queries[0])  # warm up plan cache
+    times = []
+    for names in queries:
+        start = time.perf_counter()
+        fn(workspace_id, names)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def summary(times: list[float]) -> str:
+    p95 = statistics.quantiles(times, n=20)[-1]
+    return f"{statistics.median(times):>9.1f} {p95:>9.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retrieve_context")
+    parser.add_argument("--sizes", type=int, nargs="+", default=ENTITY_COUNTS)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    if not neo4j_adapter.driver:
+        raise SystemExit("NEO4J_URI is not set")
+
+    neo4j_adapter.init_db()
+    print(f"{'entities':>10} {'old p50':>9} {'old p95':>9} {'new p50':>9} {'new p95':>9}  (ms)")
+
+    for n_entities in args.sizes:
+        workspace_id = f"bench-{uuid.uuid4()}"
+        try:
+            start = time.perf_counter()
+            seed(workspace_id, n_entities)
+            print(f"seeded {n_entities} entities in {time.perf_counter() - start:.1f}s")
+
+            # Mix exact names with single words that only match as part of a name
+            queries = [
+                [entity_name(random.randrange(n_entities)), random.choice(WORDS) + " " + random.choice(WORDS)]
+                for _ in range(args.queries)
+            ]
+            old_times = latencies(old_lookup, workspace_id, queries)
+            new_times = latencies(new_lookup, workspace_id, queries)
+        finally:
+            drop_workspace(workspace_id)
+
+        print(f"{n_entities:>10} {summary(old_times)} {summary(new_times)}")
+
+    neo4j_adapter.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Local stand-in for the Groq chat completions API, for exercising rate limiting,
+backoff and caching without spending real quota.
+
+Serves POST /openai/v1/chat/completions with a canned completion after a fixed
+latency, and answers 429 with a Retry-After header once more than --rpm requests
+arrive within a minute (or randomly with --error-rate).
+
+    cd backend && python -m benchmarks.fake_groq_server --port 8900 --rpm 20
+    GROQ_BASE_URL=http://localhost:8900 GROQ_API_KEY=fake python -m workers.main
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import deque
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI(title="Fake Groq")
+config = {"latency": 0.5, "rpm": 30, "error_rate": 0.0}
+recent = deque()
+stats = {"requests": 0, "rate_limited": 0}
+
+
+def completion(body: dict) -> dict:
+    wants_json = (body.get("response_format") or {}).get("type") == "json_object"
+    content = json.dumps({"entities": [], "relationships": []}) if wants_json else "This is a fake answer."
+    return {
+        "id": f"chatcmpl-fake-{stats['requests']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    }
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+
+    now = time.time()
+    while recent and recent[0] < now - 60:
+        recent.popleft()
+
+    if len(recent) >= config["rpm"] or random.random() < config["error_rate"]:
+        stats["rate_limited"] += 1
+        retry_after = max(1, int(60 - (now - recent[0]))) if recent else 1
+        return JSONResponse(
+            status_code=429,
+            headers={"retry-after": str(retry_after)},
+            content={"error": {"message": "Rate limit reached", "type": "tokens", "code": "rate_limit_exceeded"}}
+        )
+
+    recent.append(now)
+    await asyncio.sleep(config["latency"])
+    return completion(body)
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Groq server")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds per completion")
+    parser.add_argument("--rpm", type=int, default=30, help="Requests per minute before answering 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Extra random 429 probability")
+    args = parser.parse_args()
+
+    config.update(latency=args.latency, rpm=args.rpm, error_rate=args.error_rate)
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
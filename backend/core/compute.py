@@ -0,0 +1,54 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ComputeOverloaded(Exception):
+    """Raised when the CPU pool's queue stays full for longer than COMPUTE_QUEUE_TIMEOUT."""
+
+
+class BoundedComputePool:
+    """
+    Runs CPU-bound model work (query embedding, reranking) off the event loop.
+    At most `max_workers` calls run at once and at most `max_queue` more may wait; further
+    callers wait up to `queue_timeout` seconds for a slot and are then rejected, so a burst
+    of queries degrades into fast 503s instead of an unbounded backlog. Threads are enough
+    here because torch releases the GIL inside inference.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, queue_timeout: float):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="compute")
+        self.capacity = max_workers + max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = None
+
+    @property
+    def slots(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the running event loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.capacity)
+        return self._slots
+
+    async def run(self, fn, *args, **kwargs):
+        try:
+            await asyncio.wait_for(self.slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Compute pool saturated, rejecting request")
+            raise ComputeOverloaded("Server is busy, please retry shortly")
+
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, partial(fn, *args, **kwargs))
+        finally:
+            self.slots.release()
+
+
+compute_pool = BoundedComputePool(
+    max_workers=settings.COMPUTE_POOL_SIZE,
+    max_queue=settings.COMPUTE_QUEUE_SIZE,
+    queue_timeout=settings.COMPUTE_QUEUE_TIMEOUT
+)
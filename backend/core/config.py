@@ -12,14 +12,93 @@ class Settings:
     NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
     NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
     NEO4J_DATABASE = os.getenv("NEO4J_DATABASE", "neo4j")
+    NEO4J_WRITE_BATCH_SIZE = int(os.getenv("NEO4J_WRITE_BATCH_SIZE", "1000"))
     
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+    # Point at a local fake server for testing (see benchmarks/fake_groq_server.py)
+    GROQ_BASE_URL = os.getenv("GROQ_BASE_URL")
+
+    # Groq rate limiting shared by all processes through Redis
+    LLM_RATE_LIMIT_ENABLED = os.getenv("LLM_RATE_LIMIT_ENABLED", "true").lower() == "true"
+    LLM_REQUESTS_PER_MIN = int(os.getenv("LLM_REQUESTS_PER_MIN", "30"))
+    LLM_TOKENS_PER_MIN = int(os.getenv("LLM_TOKENS_PER_MIN", "6000"))
+    # Share of each bucket that background extraction may not use
+    LLM_BACKGROUND_RESERVE = float(os.getenv("LLM_BACKGROUND_RESERVE", "0.2"))
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+    LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+    LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30.0"))
+
+    # LLM response cache: none | disk | redis. Only the listed call sites use it;
+    # answer generation is left out by default so answers always reflect fresh context.
+    LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "none").lower()
+    LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", ".cache")
+    LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))
+    LLM_CACHE_SITES = os.getenv("LLM_CACHE_SITES", "extraction,query_entities")
     
     REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+
+    # Worker: plain | preload | pool (see workers/main.py)
+    WORKER_MODE = os.getenv("WORKER_MODE", "preload")
+    WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE", "2"))
+
+    # Ingestion: LLM extraction runs over windows of consecutive chunks
+    EXTRACTION_WINDOW_CHARS = int(os.getenv("EXTRACTION_WINDOW_CHARS", "4000"))
+    EXTRACTION_CONCURRENCY = int(os.getenv("EXTRACTION_CONCURRENCY", "4"))
+    # Chunks are embedded and stored in batches as they stream off the parser
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+    # Rows per document_embeddings insert request, and how many requests run in parallel
+    EMBEDDING_PAGE_SIZE = int(os.getenv("EMBEDDING_PAGE_SIZE", "64"))
+    EMBEDDING_PAGE_CONCURRENCY = int(os.getenv("EMBEDDING_PAGE_CONCURRENCY", "4"))
+
+    # Embedding cache: in-process LRU entries (0 disables), optional shared Redis tier
+    EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "20000"))
+    EMBEDDING_CACHE_REDIS = os.getenv("EMBEDDING_CACHE_REDIS", "false").lower() == "true"
+    EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", str(7 * 24 * 3600)))
     
     PORT = int(os.getenv("PORT", "8000"))
 
+    # Semantic answer cache (Redis): reuse a workspace's answer for near-identical questions
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+    ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "86400"))
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "500"))
+
+    # JWT verification: JWKS refresh cadence and the verified-token cache
+    JWKS_REFRESH_INTERVAL = int(os.getenv("JWKS_REFRESH_INTERVAL", "3600"))
+    JWKS_MIN_REFRESH_INTERVAL = int(os.getenv("JWKS_MIN_REFRESH_INTERVAL", "30"))
+    JWKS_FETCH_TIMEOUT = float(os.getenv("JWKS_FETCH_TIMEOUT", "5"))
+    JWT_CACHE_MAX_ENTRIES = int(os.getenv("JWT_CACHE_MAX_ENTRIES", "10000"))
+
+    # Per-process cache of workspace ownership checks (seconds)
+    WORKSPACE_CACHE_TTL = int(os.getenv("WORKSPACE_CACHE_TTL", "30"))
+    WORKSPACE_CACHE_NEGATIVE_TTL = int(os.getenv("WORKSPACE_CACHE_NEGATIVE_TTL", "5"))
+    WORKSPACE_CACHE_MAX_ENTRIES = int(os.getenv("WORKSPACE_CACHE_MAX_ENTRIES", "10000"))
+
+    # Versioned, gzip-compressed workspace graph snapshots: none | disk | redis
+    GRAPH_CACHE_BACKEND = os.getenv("GRAPH_CACHE_BACKEND", "redis").lower()
+    GRAPH_CACHE_DIR = os.getenv("GRAPH_CACHE_DIR", ".cache")
+    GRAPH_CACHE_TTL = int(os.getenv("GRAPH_CACHE_TTL", str(24 * 3600)))
+
+    # Keyset page size for graph pagination and NDJSON export
+    GRAPH_PAGE_SIZE = int(os.getenv("GRAPH_PAGE_SIZE", "1000"))
+    GRAPH_PAGE_MAX = int(os.getenv("GRAPH_PAGE_MAX", "5000"))
+
+    # Dictionary matcher for query entities; the LLM is only asked when it finds nothing
+    ENTITY_MATCHER_ENABLED = os.getenv("ENTITY_MATCHER_ENABLED", "true").lower() == "true"
+    ENTITY_MATCHER_LLM_FALLBACK = os.getenv("ENTITY_MATCHER_LLM_FALLBACK", "true").lower() == "true"
+    ENTITY_MATCHER_MAX_WORKSPACES = int(os.getenv("ENTITY_MATCHER_MAX_WORKSPACES", "256"))
+    ENTITY_MATCHER_TTL = int(os.getenv("ENTITY_MATCHER_TTL", "3600"))
+    ENTITY_MATCHER_MIN_NAME_LENGTH = int(os.getenv("ENTITY_MATCHER_MIN_NAME_LENGTH", "3"))
+
+    # Bounded pool for CPU-bound model work on the query path (embedding, reranking)
+    COMPUTE_POOL_SIZE = int(os.getenv("COMPUTE_POOL_SIZE", "2"))
+    COMPUTE_QUEUE_SIZE = int(os.getenv("COMPUTE_QUEUE_SIZE", "32"))
+    COMPUTE_QUEUE_TIMEOUT = float(os.getenv("COMPUTE_QUEUE_TIMEOUT", "5"))
+    MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+    MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "10"))
+
 settings = Settings()
 
 # Setup logging configuration
@@ -1,7 +1,11 @@
 from fastapi import Request, HTTPException, status
 from jose import jwt, JWTError
 from jose.backends.cryptography_backend import CryptographyECKey
-import requests
+from cachetools import LRUCache
+import asyncio
+import hashlib
+import httpx
+import time
 from core.config import settings
 import logging
 
@@ -12,14 +16,96 @@ if not settings.SUPABASE_URL:
 
 JWKS_URL = f"{settings.SUPABASE_URL}/auth/v1/.well-known/jwks.json"
 
-try:
-    jwks = requests.get(JWKS_URL).json()
-except Exception as e:
-    logger.warning(f"Failed to fetch JWKS on startup: {e}")
-    jwks = {"keys": []}
+
+class JWKSCache:
+    """
+    Supabase signing keys, parsed once per kid. Fetches are async, single-flight (concurrent
+    callers share one request) and, when triggered by an unknown kid, at most one per
+    JWKS_MIN_REFRESH_INTERVAL, so a burst of forged tokens cannot become a burst of fetches.
+    The lifespan does the first fetch and keeps the keys fresh in the background.
+    """
+
+    def __init__(self, url: str, min_interval: float, timeout: float):
+        self.url = url
+        self.min_interval = min_interval
+        self.timeout = timeout
+        self.keys = {}
+        self.last_fetch = 0.0
+        self._inflight = None
+
+    async def refresh(self, force: bool = False):
+        # A fetch already running sets last_fetch at its start: wait for its keys rather
+        # than returning early on the rate limit with a key set that is about to change
+        pending = self._inflight is not None and not self._inflight.done()
+        if not force and not pending and time.monotonic() - self.last_fetch < self.min_interval:
+            return
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._fetch())
+        inflight = self._inflight
+        try:
+            await asyncio.shield(inflight)
+        finally:
+            if self._inflight is inflight and inflight.done():
+                self._inflight = None
+
+    async def _fetch(self):
+        self.last_fetch = time.monotonic()
+        try:
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                response = await client.get(self.url)
+                response.raise_for_status()
+                jwks = response.json()
+        except Exception as e:
+            logger.warning(f"Failed to fetch JWKS: {e}")
+            return
+
+        keys = {}
+        for jwk_key in jwks.get("keys", []):
+            try:
+                keys[jwk_key["kid"]] = CryptographyECKey(jwk_key, algorithm="ES256")
+            except Exception as e:
+                logger.warning(f"Skipping unusable JWKS key {jwk_key.get('kid')}: {e}")
+        self.keys = keys
+        logger.info(f"Loaded {len(keys)} JWKS keys")
+
+    async def get(self, kid: str):
+        key = self.keys.get(kid)
+        if key is None:
+            # Possibly rotated: refetch, subject to the rate limit
+            await self.refresh()
+            key = self.keys.get(kid)
+        return key
+
+    async def run_rotation(self, interval: float):
+        """Background task: refetches the key set every `interval` seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            await self.refresh(force=True)
+
+
+jwks_cache = JWKSCache(
+    JWKS_URL,
+    min_interval=settings.JWKS_MIN_REFRESH_INTERVAL,
+    timeout=settings.JWKS_FETCH_TIMEOUT
+)
+
+# sha256(token) -> (kid, payload); entries are honoured until the token's exp
+verified_tokens = LRUCache(maxsize=settings.JWT_CACHE_MAX_ENTRIES)
+
+
+def _cached_payload(token_hash: str):
+    entry = verified_tokens.get(token_hash)
+    if entry is None:
+        return None
+    kid, payload = entry
+    # Expired, or signed by a key that has since been rotated out
+    if payload.get("exp", 0) <= time.time() or kid not in jwks_cache.keys:
+        verified_tokens.pop(token_hash, None)
+        return None
+    return payload
+
 
 async def get_current_user(request: Request):
-    global jwks
     auth_header = request.headers.get("Authorization")
 
     if not auth_header or not auth_header.startswith("Bearer "):
@@ -29,25 +115,21 @@ async def get_current_user(request: Request):
         )
 
     token = auth_header.split(" ")[1]
- 
+    token_hash = hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    payload = _cached_payload(token_hash)
+    if payload is not None:
+        return payload
+
     try:
         headers = jwt.get_unverified_header(token)
         kid = headers.get("kid")
         if not kid:
             raise JWTError("kid missing from headers")
 
-        jwk_key = next((k for k in jwks.get("keys", []) if k["kid"] == kid), None)
-        
-        # If not found, possibly JWKS rotated, so fetch again
-        if not jwk_key:
-            # global jwks
-            jwks = requests.get(JWKS_URL).json()
-            jwk_key = next((k for k in jwks.get("keys", []) if k["kid"] == kid), None)
-            if not jwk_key:
-                raise JWTError("matching key not found in JWKS")
-
-        # Convert JWK to proper EC key
-        public_key = CryptographyECKey(jwk_key, algorithm="ES256")
+        public_key = await jwks_cache.get(kid)
+        if public_key is None:
+            raise JWTError("matching key not found in JWKS")
 
         payload = jwt.decode(
             token,
@@ -56,6 +138,8 @@ async def get_current_user(request: Request):
             audience="authenticated",
         )
 
+        if "exp" in payload:
+            verified_tokens[token_hash] = (kid, payload)
         return payload
 
     except JWTError as e:
@@ -0,0 +1,72 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Rejects upload requests larger than `max_bytes` before the body is buffered.
+    Requests with a Content-Length are refused up front; chunked bodies are counted
+    as they are received and aborted as soon as they cross the limit.
+    """
+
+    def __init__(self, app, max_bytes: int, path_suffixes: tuple = ("/upload",)):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_suffixes = path_suffixes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].endswith(self.path_suffixes):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            await self._reject(send)
+            return
+
+        received = 0
+        response_started = False
+        rejected = False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes and not rejected:
+                    logger.warning(f"Rejected upload to {scope['path']}: body exceeds {self.max_bytes} bytes")
+                    rejected = True
+                    if not response_started:
+                        await self._reject(send)
+                    # FastAPI converts body parsing errors into a 400, which guarded_send drops
+                    raise UploadTooLarge()
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if rejected:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except UploadTooLarge:
+            pass
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": f"File too large (max {self.max_bytes} bytes)"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        })
+        await send({"type": "http.response.body", "body": body})
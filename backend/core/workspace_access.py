@@ -0,0 +1,88 @@
+import logging
+import threading
+from cachetools import TTLCache
+from fastapi import Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from postgrest.exceptions import APIError
+from core.config import settings
+from core.security import get_current_user
+from infrastructure.supabase_adapter import supabase_adapter
+
+logger = logging.getLogger(__name__)
+
+# PostgREST's answer to .single() when no row matches
+NO_ROWS = "PGRST116"
+
+
+class WorkspaceCache:
+    """
+    Short-lived cache of workspace rows keyed by (user_id, workspace_id), so authorising a
+    request does not cost a PostgREST round trip. Misses (unknown workspace or not the
+    caller's) are cached too, for a shorter time. Routes that change a workspace invalidate
+    it here; changes made by workers are picked up once the entry expires.
+    """
+
+    def __init__(self, max_entries: int, ttl: int, negative_ttl: int):
+        self.found = TTLCache(maxsize=max_entries, ttl=ttl)
+        self.missing = TTLCache(maxsize=max_entries, ttl=negative_ttl)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _fetch(user_id: str, workspace_id: str):
+        try:
+            return supabase_adapter.get_workspace(workspace_id, user_id)
+        except APIError as e:
+            if e.code == NO_ROWS:
+                return None
+            raise
+
+    def get(self, user_id: str, workspace_id: str, fresh: bool = False):
+        """Returns the workspace row if `user_id` owns it, else None. `fresh` skips the cache."""
+        key = (user_id, workspace_id)
+        if not fresh:
+            with self.lock:
+                if key in self.missing:
+                    return None
+                workspace = self.found.get(key)
+            if workspace is not None:
+                return workspace
+
+        workspace = self._fetch(user_id, workspace_id)
+        with self.lock:
+            if workspace:
+                self.found[key] = workspace
+                self.missing.pop(key, None)
+            else:
+                self.missing[key] = True
+                self.found.pop(key, None)
+        return workspace
+
+    def invalidate(self, workspace_id: str):
+        with self.lock:
+            for cache in (self.found, self.missing):
+                for key in [k for k in cache.keys() if k[1] == workspace_id]:
+                    cache.pop(key, None)
+
+
+workspace_cache = WorkspaceCache(
+    max_entries=settings.WORKSPACE_CACHE_MAX_ENTRIES,
+    ttl=settings.WORKSPACE_CACHE_TTL,
+    negative_ttl=settings.WORKSPACE_CACHE_NEGATIVE_TTL
+)
+
+
+async def require_workspace(user_id: str, workspace_id: str, fresh: bool = False) -> dict:
+    workspace = await run_in_threadpool(workspace_cache.get, user_id, workspace_id, fresh)
+    if not workspace:
+        raise HTTPException(status_code=404, detail="Workspace not found or access denied")
+    return workspace
+
+
+async def get_owned_workspace(workspace_id: str, user: dict = Depends(get_current_user)) -> dict:
+    """Dependency: the caller's workspace from the path, served from the ownership cache."""
+    return await require_workspace(user["sub"], workspace_id)
+
+
+async def get_owned_workspace_fresh(workspace_id: str, user: dict = Depends(get_current_user)) -> dict:
+    """Like `get_owned_workspace`, but re-reads the row; for checks on counters such as doc_count."""
+    return await require_workspace(user["sub"], workspace_id, fresh=True)
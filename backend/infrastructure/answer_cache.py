@@ -0,0 +1,126 @@
+import hashlib
+import json
+import logging
+import re
+import time
+import numpy as np
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    query = query.lower().strip()
+    query = re.sub(r"\s+", " ", query)
+    return query.rstrip("?!. ")
+
+
+class AnswerCache:
+    """
+    Per-workspace cache of query responses in Redis.
+    A lookup first tries the exact normalized query, then the cached query whose embedding
+    is most similar, accepting it above ANSWER_CACHE_THRESHOLD. Entries live under the
+    workspace's current generation; `invalidate` bumps the generation so every process
+    stops seeing the old answers at once, and the orphaned keys expire on their TTL.
+    """
+
+    def __init__(self, redis_conn, threshold: float, ttl: int, max_entries: int):
+        self.redis = redis_conn
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    def _generation(self, workspace_id: str) -> int:
+        return int(self.redis.get(f"answers:gen:{workspace_id}") or 0)
+
+    @staticmethod
+    def _entries_key(workspace_id: str, generation: int) -> str:
+        return f"answers:{workspace_id}:{generation}"
+
+    def lookup(self, workspace_id: str, query: str, query_embedding: list[float]):
+        """Returns (response dict or None, generation). Pass the generation back to `store`."""
+        try:
+            generation = self._generation(workspace_id)
+            key = self._entries_key(workspace_id, generation)
+            normalized = normalize_query(query)
+
+            exact = self.redis.hget(key, hashlib.sha256(normalized.encode()).hexdigest())
+            if exact:
+                return json.loads(exact)["response"], generation
+
+            entries = [json.loads(v) for v in self.redis.hvals(key)]
+            if not entries:
+                return None, generation
+
+            # Embeddings are normalized, so the dot product is the cosine similarity
+            matrix = np.array([e["embedding"] for e in entries], dtype=np.float32)
+            scores = matrix @ np.asarray(query_embedding, dtype=np.float32)
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                logger.info(f"Answer cache hit for '{query}' via '{entries[best]['query']}' ({scores[best]:.3f})")
+                return entries[best]["response"], generation
+            return None, generation
+        except Exception as e:
+            logger.warning(f"Answer cache lookup failed: {e}")
+            return None, None
+
+    def store(self, workspace_id: str, generation: int, query: str, query_embedding: list[float], response: dict):
+        """Callers must only store answers generated successfully from retrieved context."""
+        if generation is None or not response.get("answer"):
+            return
+        try:
+            key = self._entries_key(workspace_id, generation)
+            normalized = normalize_query(query)
+            entry = {
+                "query": normalized,
+                "embedding": [round(float(x), 6) for x in query_embedding],
+                "response": response,
+                "stored_at": time.time()
+            }
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hset(key, hashlib.sha256(normalized.encode()).hexdigest(), json.dumps(entry))
+            pipe.expire(key, self.ttl)
+            pipe.hlen(key)
+            size = pipe.execute()[-1]
+
+            if size > self.max_entries:
+                self._evict_oldest(key, size - self.max_entries)
+        except Exception as e:
+            logger.warning(f"Answer cache write failed: {e}")
+
+    def _evict_oldest(self, key: str, count: int):
+        entries = self.redis.hgetall(key)
+        by_age = sorted(entries.items(), key=lambda item: json.loads(item[1])["stored_at"])
+        self.redis.hdel(key, *[field for field, _ in by_age[:count]])
+
+    def invalidate(self, workspace_id: str):
+        """Called whenever the workspace's documents or graph change."""
+        try:
+            self.redis.incr(f"answers:gen:{workspace_id}")
+        except Exception as e:
+            logger.warning(f"Answer cache invalidation failed for {workspace_id}: {e}")
+
+
+def build_answer_cache():
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+
+    from infrastructure.redis_adapter import redis_adapter
+    if not redis_adapter.redis_conn:
+        logger.warning("Answer cache needs Redis; disabled")
+        return None
+
+    return AnswerCache(
+        redis_adapter.redis_conn,
+        threshold=settings.ANSWER_CACHE_THRESHOLD,
+        ttl=settings.ANSWER_CACHE_TTL,
+        max_entries=settings.ANSWER_CACHE_MAX_ENTRIES
+    )
+
+
+answer_cache = build_answer_cache()
+
+
+def invalidate_answers(workspace_id: str):
+    if answer_cache:
+        answer_cache.invalidate(workspace_id)
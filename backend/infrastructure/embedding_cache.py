@@ -0,0 +1,119 @@
+import hashlib
+import logging
+import threading
+import numpy as np
+from cachetools import LRUCache
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache of embedding vectors keyed by (model_name, sha256(text)).
+    Vectors are stored as float32 bytes in a bounded in-process LRU and, optionally,
+    in Redis with a TTL so that worker and API processes share results.
+    """
+
+    def __init__(self, model_name: str, max_entries: int, redis_conn=None, ttl: int = 0):
+        self.model_name = model_name
+        self.memory = LRUCache(maxsize=max_entries)
+        self.redis = redis_conn
+        self.ttl = ttl
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def key(self, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"emb:{self.model_name}:{digest}"
+
+    @staticmethod
+    def _encode(vector) -> bytes:
+        return np.asarray(vector, dtype=np.float32).tobytes()
+
+    @staticmethod
+    def _decode(raw: bytes) -> list[float]:
+        return np.frombuffer(raw, dtype=np.float32).tolist()
+
+    def get_many(self, keys: list[str]) -> dict:
+        """Returns {key: vector} for every key found in either tier."""
+        found = {}
+        remote_keys = []
+
+        with self.lock:
+            for k in keys:
+                raw = self.memory.get(k)
+                if raw is not None:
+                    found[k] = self._decode(raw)
+                    self.hits += 1
+                else:
+                    remote_keys.append(k)
+
+        if remote_keys and self.redis:
+            try:
+                values = self.redis.mget(remote_keys)
+                with self.lock:
+                    for k, raw in zip(remote_keys, values):
+                        if raw is not None:
+                            self.memory[k] = raw
+                            found[k] = self._decode(raw)
+                            self.redis_hits += 1
+            except Exception as e:
+                logger.warning(f"Embedding cache Redis lookup failed: {e}")
+
+        with self.lock:
+            self.misses += len(keys) - len(found)
+
+        return found
+
+    def put_many(self, items: dict):
+        """Stores {key: vector} in both tiers."""
+        encoded = {k: self._encode(v) for k, v in items.items()}
+
+        with self.lock:
+            for k, raw in encoded.items():
+                self.memory[k] = raw
+
+        if encoded and self.redis:
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                for k, raw in encoded.items():
+                    pipe.set(k, raw, ex=self.ttl or None)
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"Embedding cache Redis write failed: {e}")
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.redis_hits + self.misses
+            return {
+                "entries": len(self.memory),
+                "max_entries": self.memory.maxsize,
+                "hits": self.hits,
+                "redis_hits": self.redis_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.redis_hits) / lookups if lookups else 0.0
+            }
+
+
+def build_embedding_cache(model_name: str):
+    """Builds the cache from settings, or returns None when caching is disabled."""
+    if settings.EMBEDDING_CACHE_SIZE <= 0:
+        return None
+
+    redis_conn = None
+    if settings.EMBEDDING_CACHE_REDIS:
+        from infrastructure.redis_adapter import redis_adapter
+        redis_conn = redis_adapter.redis_conn
+        if not redis_conn:
+            logger.warning("EMBEDDING_CACHE_REDIS is set but Redis is unavailable; using in-process cache only")
+
+    return EmbeddingCache(
+        model_name,
+        max_entries=settings.EMBEDDING_CACHE_SIZE,
+        redis_conn=redis_conn,
+        ttl=settings.EMBEDDING_CACHE_TTL
+    )
@@ -1,13 +1,16 @@
 import logging
 from sentence_transformers import SentenceTransformer
+from infrastructure.embedding_cache import build_embedding_cache
 
 logger = logging.getLogger(__name__)
 
 
 class EmbeddingProvider:
     def __init__(self):
+        self.model_name = "all-MiniLM-L6-v2"
+        self.cache = build_embedding_cache(self.model_name)
+
         try:
-            self.model_name = "all-MiniLM-L6-v2"
             self.model = SentenceTransformer(self.model_name)
 
             logger.info(f"SentenceTransformer '{self.model_name}' loaded successfully")
@@ -20,6 +23,27 @@ class EmbeddingProvider:
         if not self.model:
             raise ValueError("Embedding model not initialized")
 
+        if not self.cache:
+            return self._encode_batch(texts)
+
+        # Embed only the cache misses, then restore the original order
+        keys = [self.cache.key(t) for t in texts]
+        found = self.cache.get_many(list(dict.fromkeys(keys)))
+
+        missing = {}
+        for k, text in zip(keys, texts):
+            if k not in found:
+                missing.setdefault(k, text)
+
+        if missing:
+            vectors = self._encode_batch(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(computed)
+            found.update(computed)
+
+        return [found[k] for k in keys]
+
+    def _encode_batch(self, texts: list[str]) -> list[list[float]]:
         try:
             embeddings = self.model.encode(
                 texts,
@@ -38,17 +62,26 @@ class EmbeddingProvider:
         if not self.model:
             raise ValueError("Embedding model not initialized")
 
+        if self.cache:
+            key = self.cache.key(query)
+            cached = self.cache.get_many([key]).get(key)
+            if cached is not None:
+                return cached
+
         try:
             embedding = self.model.encode(
                 query,
                 normalize_embeddings=True
-            )
-
-            return embedding.tolist()
+            ).tolist()
 
         except Exception as e:
             logger.error(f"Query embedding failed: {e}")
             raise
 
+        if self.cache:
+            self.cache.put_many({key: embedding})
+
+        return embedding
+
 
-embedding_provider = EmbeddingProvider()
\ No newline at end of file
+embedding_provider = EmbeddingProvider()
@@ -0,0 +1,158 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _initial_version() -> int:
+    # Counters start from the clock rather than 0, so a lost counter can never hand out
+    # a version (and ETag) that a client already cached for older data
+    return int(time.time() * 1000)
+
+
+class DiskBackend:
+    """SQLite file in GRAPH_CACHE_DIR, shared by the processes on one host."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS graph_versions (workspace_id TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS graph_snapshots (
+                workspace_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def version(self, workspace_id: str) -> int:
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO graph_versions VALUES (?, ?)", (workspace_id, _initial_version())
+            )
+            self.conn.commit()
+            return self.conn.execute(
+                "SELECT version FROM graph_versions WHERE workspace_id = ?", (workspace_id,)
+            ).fetchone()[0]
+
+    def bump(self, workspace_id: str):
+        with self.lock:
+            self.conn.execute("""
+                INSERT INTO graph_versions VALUES (?, ?)
+                ON CONFLICT (workspace_id) DO UPDATE SET version = version + 1
+            """, (workspace_id, _initial_version()))
+            self.conn.execute("DELETE FROM graph_snapshots WHERE workspace_id = ?", (workspace_id,))
+            self.conn.commit()
+
+    def get(self, workspace_id: str, version: int):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT data FROM graph_snapshots WHERE workspace_id = ? AND version = ? AND expires_at > ?",
+                (workspace_id, version, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, workspace_id: str, version: int, data: bytes, ttl: int):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO graph_snapshots VALUES (?, ?, ?, ?)",
+                (workspace_id, version, data, time.time() + ttl)
+            )
+            self.conn.commit()
+
+
+class RedisBackend:
+    """Version counters never expire; snapshots are keyed by version and expire via TTL."""
+
+    def __init__(self, redis_conn):
+        self.redis = redis_conn
+
+    def version(self, workspace_id: str) -> int:
+        key = f"graph:version:{workspace_id}"
+        raw = self.redis.get(key)
+        if raw is None:
+            self.redis.set(key, _initial_version(), nx=True)
+            raw = self.redis.get(key)
+        return int(raw)
+
+    def bump(self, workspace_id: str):
+        key = f"graph:version:{workspace_id}"
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.set(key, _initial_version(), nx=True)
+        pipe.incr(key)
+        pipe.execute()
+
+    def get(self, workspace_id: str, version: int):
+        return self.redis.get(f"graph:snapshot:{workspace_id}:{version}")
+
+    def set(self, workspace_id: str, version: int, data: bytes, ttl: int):
+        self.redis.set(f"graph:snapshot:{workspace_id}:{version}", data, ex=ttl)
+
+
+class GraphSnapshotCache:
+    """
+    Per-workspace graph version counter plus the serialized, gzip-compressed graph for the
+    current version. Every graph write bumps the version, which makes the cached snapshot
+    unreachable; the version doubles as the HTTP ETag. Failures degrade to no caching.
+    """
+
+    def __init__(self, backend, ttl: int):
+        self.backend = backend
+        self.ttl = ttl
+
+    def version(self, workspace_id: str):
+        try:
+            return self.backend.version(workspace_id)
+        except Exception as e:
+            logger.warning(f"Graph version lookup failed for {workspace_id}: {e}")
+            return None
+
+    def bump(self, workspace_id: str):
+        try:
+            self.backend.bump(workspace_id)
+        except Exception as e:
+            logger.warning(f"Graph version bump failed for {workspace_id}: {e}")
+
+    def get(self, workspace_id: str, version: int):
+        try:
+            return self.backend.get(workspace_id, version)
+        except Exception as e:
+            logger.warning(f"Graph snapshot lookup failed for {workspace_id}: {e}")
+            return None
+
+    def set(self, workspace_id: str, version: int, data: bytes):
+        try:
+            self.backend.set(workspace_id, version, data, self.ttl)
+        except Exception as e:
+            logger.warning(f"Graph snapshot write failed for {workspace_id}: {e}")
+
+
+def build_graph_snapshot_cache():
+    """Builds the cache from settings, or returns None when GRAPH_CACHE_BACKEND is 'none'."""
+    backend_name = settings.GRAPH_CACHE_BACKEND
+    if backend_name == "none":
+        return None
+
+    if backend_name == "redis":
+        from infrastructure.redis_adapter import redis_adapter
+        if not redis_adapter.redis_conn:
+            logger.warning("GRAPH_CACHE_BACKEND is redis but Redis is unavailable; graph cache disabled")
+            return None
+        backend = RedisBackend(redis_adapter.redis_conn)
+    elif backend_name == "disk":
+        backend = DiskBackend(os.path.join(settings.GRAPH_CACHE_DIR, "graph_cache.sqlite3"))
+    else:
+        logger.warning(f"Unknown GRAPH_CACHE_BACKEND '{backend_name}'; graph cache disabled")
+        return None
+
+    return GraphSnapshotCache(backend, settings.GRAPH_CACHE_TTL)
+
+
+graph_snapshots = build_graph_snapshot_cache()
@@ -0,0 +1,231 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class DiskBackend:
+    """SQLite file in LLM_CACHE_DIR. Expired entries are ignored; the least recently used are evicted."""
+
+    def __init__(self, path: str, max_entries: int):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                latency REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at)")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache_metrics (
+                site TEXT PRIMARY KEY,
+                hits INTEGER NOT NULL,
+                misses INTEGER NOT NULL,
+                saved_seconds REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def get(self, key: str):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value, latency FROM llm_cache WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row:
+                self.conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                self.conn.commit()
+        return row
+
+    def set(self, key: str, value: str, latency: float, ttl: int):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?)",
+                (key, value, latency, now + ttl, now)
+            )
+            self.conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+            self.conn.execute("""
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+            self.conn.commit()
+
+    def size(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT count(*) FROM llm_cache").fetchone()[0]
+
+    def record(self, site: str, hits: int, misses: int, saved_seconds: float):
+        with self.lock:
+            self.conn.execute("""
+                INSERT INTO llm_cache_metrics VALUES (?, ?, ?, ?)
+                ON CONFLICT (site) DO UPDATE SET
+                    hits = hits + excluded.hits,
+                    misses = misses + excluded.misses,
+                    saved_seconds = saved_seconds + excluded.saved_seconds
+            """, (site, hits, misses, saved_seconds))
+            self.conn.commit()
+
+    def metrics(self) -> dict:
+        with self.lock:
+            rows = self.conn.execute("SELECT site, hits, misses, saved_seconds FROM llm_cache_metrics").fetchall()
+        return {site: {"hits": h, "misses": m, "saved_seconds": s} for site, h, m, s in rows}
+
+
+class RedisBackend:
+    """Entries expire via Redis TTL; a sorted set of access times bounds the entry count."""
+
+    INDEX_KEY = "llm:index"
+    METRICS_SITES_KEY = "llm:metrics:sites"
+
+    def __init__(self, redis_conn, max_entries: int):
+        self.redis = redis_conn
+        self.max_entries = max_entries
+
+    def get(self, key: str):
+        raw = self.redis.get(f"llm:{key}")
+        if raw is None:
+            return None
+        self.redis.zadd(self.INDEX_KEY, {key: time.time()})
+        entry = json.loads(raw)
+        return entry["value"], entry["latency"]
+
+    def set(self, key: str, value: str, latency: float, ttl: int):
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.set(f"llm:{key}", json.dumps({"value": value, "latency": latency}), ex=ttl)
+        pipe.zadd(self.INDEX_KEY, {key: time.time()})
+        pipe.zcard(self.INDEX_KEY)
+        size = pipe.execute()[-1]
+
+        excess = size - self.max_entries
+        if excess > 0:
+            evicted = [k.decode() if isinstance(k, bytes) else k for k, _ in self.redis.zpopmin(self.INDEX_KEY, excess)]
+            self.redis.delete(*[f"llm:{k}" for k in evicted])
+
+    def size(self) -> int:
+        return self.redis.zcard(self.INDEX_KEY)
+
+    def record(self, site: str, hits: int, misses: int, saved_seconds: float):
+        key = f"llm:metrics:{site}"
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.sadd(self.METRICS_SITES_KEY, site)
+        pipe.hincrby(key, "hits", hits)
+        pipe.hincrby(key, "misses", misses)
+        pipe.hincrbyfloat(key, "saved_seconds", saved_seconds)
+        pipe.execute()
+
+    def metrics(self) -> dict:
+        sites = sorted(s.decode() if isinstance(s, bytes) else s for s in self.redis.smembers(self.METRICS_SITES_KEY))
+        pipe = self.redis.pipeline(transaction=False)
+        for site in sites:
+            pipe.hgetall(f"llm:metrics:{site}")
+        metrics = {}
+        for site, raw in zip(sites, pipe.execute()):
+            raw = {(k.decode() if isinstance(k, bytes) else k): v for k, v in raw.items()}
+            metrics[site] = {
+                "hits": int(raw.get("hits", 0)),
+                "misses": int(raw.get("misses", 0)),
+                "saved_seconds": float(raw.get("saved_seconds", 0.0))
+            }
+        return metrics
+
+
+class LLMCache:
+    """
+    Opt-in cache of LLM completions keyed by (model, system_prompt, prompt, response_format).
+    Only call sites listed in LLM_CACHE_SITES use it. Per-site hit/miss counts and the
+    Groq latency saved by hits are kept in the backend, so the metrics endpoint also sees
+    lookups made by the RQ workers.
+    """
+
+    def __init__(self, backend, ttl: int, sites: set):
+        self.backend = backend
+        self.ttl = ttl
+        self.sites = sites
+
+    def enabled_for(self, site: str) -> bool:
+        return site is not None and site in self.sites
+
+    @staticmethod
+    def key(model: str, system_prompt: str, prompt: str, response_format: str) -> str:
+        payload = json.dumps([model, system_prompt, prompt, response_format])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _record(self, site: str, hit: bool, latency: float = 0.0):
+        try:
+            self.backend.record(site, hits=int(hit), misses=int(not hit), saved_seconds=latency if hit else 0.0)
+        except Exception as e:
+            logger.warning(f"LLM cache metrics update failed: {e}")
+
+    def get(self, site: str, key: str):
+        try:
+            entry = self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"LLM cache lookup failed: {e}")
+            entry = None
+
+        if entry is None:
+            self._record(site, hit=False)
+            return None
+
+        value, latency = entry
+        self._record(site, hit=True, latency=latency)
+        return value
+
+    def set(self, key: str, value: str, latency: float):
+        try:
+            self.backend.set(key, value, latency, self.ttl)
+        except Exception as e:
+            logger.warning(f"LLM cache write failed: {e}")
+
+    def stats(self) -> dict:
+        try:
+            metrics = self.backend.metrics()
+        except Exception as e:
+            logger.warning(f"LLM cache metrics lookup failed: {e}")
+            metrics = {}
+        sites = {
+            site: {**m, "hit_rate": m["hits"] / (m["hits"] + m["misses"]) if m["hits"] + m["misses"] else 0.0}
+            for site, m in metrics.items()
+        }
+        try:
+            entries = self.backend.size()
+        except Exception:
+            entries = None
+        return {"enabled_sites": sorted(self.sites), "entries": entries, "sites": sites}
+
+
+def build_llm_cache():
+    """Builds the cache from settings, or returns None when LLM_CACHE_BACKEND is 'none'."""
+    backend_name = settings.LLM_CACHE_BACKEND
+    if backend_name == "none":
+        return None
+
+    if backend_name == "redis":
+        from infrastructure.redis_adapter import redis_adapter
+        if not redis_adapter.redis_conn:
+            logger.warning("LLM_CACHE_BACKEND is redis but Redis is unavailable; LLM cache disabled")
+            return None
+        backend = RedisBackend(redis_adapter.redis_conn, settings.LLM_CACHE_MAX_ENTRIES)
+    elif backend_name == "disk":
+        backend = DiskBackend(os.path.join(settings.LLM_CACHE_DIR, "llm_cache.sqlite3"), settings.LLM_CACHE_MAX_ENTRIES)
+    else:
+        logger.warning(f"Unknown LLM_CACHE_BACKEND '{backend_name}'; LLM cache disabled")
+        return None
+
+    sites = {s.strip() for s in settings.LLM_CACHE_SITES.split(",") if s.strip()}
+    logger.info(f"LLM cache enabled ({backend_name}) for call sites: {sorted(sites)}")
+    return LLMCache(backend, settings.LLM_CACHE_TTL, sites)
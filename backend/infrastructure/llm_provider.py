@@ -1,43 +1,175 @@
-from groq import Groq
+import asyncio
+import random
+import time
+from groq import Groq, AsyncGroq, RateLimitError, APIConnectionError, InternalServerError
 from core.config import settings
+from infrastructure.llm_cache import build_llm_cache
+from infrastructure.rate_limiter import build_rate_limiter, PRIORITY_INTERACTIVE
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Errors worth retrying: rate limits, dropped connections and timeouts, and 5xx responses
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+
 class LLMProvider:
     def __init__(self):
+        self.cache = build_llm_cache()
+        self.limiter = build_rate_limiter()
+
         if not settings.GROQ_API_KEY:
             logger.warning("GROQ_API_KEY is missing")
             self.client = None
+            self.async_client = None
             return
-            
-        self.client = Groq(api_key=settings.GROQ_API_KEY)
 
-    def generate_json(self, prompt: str, system_prompt: str = "You are a helpful assistant.", model: str = "llama-3.1-8b-instant") -> str:
-        if not self.client:
-            raise ValueError("Groq client not initialized")
-            
-        response = self.client.chat.completions.create(
-            messages=[
+        # Retries are handled here (see RETRYABLE_ERRORS) so 429s go through the shared limiter and backoff
+        client_kwargs = {"api_key": settings.GROQ_API_KEY, "max_retries": 0}
+        if settings.GROQ_BASE_URL:
+            client_kwargs["base_url"] = settings.GROQ_BASE_URL
+
+        self.client = Groq(**client_kwargs)
+        self.async_client = AsyncGroq(**client_kwargs)
+
+    def generate_json(self, prompt: str, system_prompt: str = "You are a helpful assistant.", model: str = "llama-3.1-8b-instant", cache_site: str = None, priority: str = PRIORITY_INTERACTIVE) -> str:
+        return self._complete(prompt, system_prompt, model, "json_object", cache_site, priority)
+
+    def generate_text(self, prompt: str, system_prompt: str = "You are a helpful assistant.", model: str = "llama-3.1-8b-instant", cache_site: str = None, priority: str = PRIORITY_INTERACTIVE) -> str:
+        return self._complete(prompt, system_prompt, model, None, cache_site, priority)
+
+    async def agenerate_json(self, prompt: str, system_prompt: str = "You are a helpful assistant.", model: str = "llama-3.1-8b-instant", cache_site: str = None, priority: str = PRIORITY_INTERACTIVE) -> str:
+        return await self._acomplete(prompt, system_prompt, model, "json_object", cache_site, priority)
+
+    async def agenerate_text(self, prompt: str, system_prompt: str = "You are a helpful assistant.", model: str = "llama-3.1-8b-instant", cache_site: str = None, priority: str = PRIORITY_INTERACTIVE) -> str:
+        return await self._acomplete(prompt, system_prompt, model, None, cache_site, priority)
+
+    @staticmethod
+    def _request(prompt: str, system_prompt: str, model: str, response_format: str = None) -> dict:
+        request = {
+            "messages": [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": prompt}
             ],
-            model=model,
-            response_format={ "type": "json_object" }
-        )
-        return response.choices[0].message.content
+            "model": model
+        }
+        if response_format:
+            request["response_format"] = {"type": response_format}
+        return request
+
+    def _cache_lookup(self, cache_site: str, model: str, system_prompt: str, prompt: str, response_format: str):
+        """Returns (key, cached value); key is None when the site does not use the cache."""
+        if self.cache is None or not self.cache.enabled_for(cache_site):
+            return None, None
+        key = self.cache.key(model, system_prompt, prompt, response_format)
+        return key, self.cache.get(cache_site, key)
+
+    def _backoff(self, error: Exception, attempt: int) -> float:
+        """
+        Delay before retrying `error`: the server's Retry-After on a 429 if given, else
+        full-jitter exponential backoff.
+        """
+        retry_after = None
+        if isinstance(error, RateLimitError) and getattr(error, "response", None) is not None:
+            retry_after = error.response.headers.get("retry-after")
+        try:
+            delay = float(retry_after) if retry_after else None
+        except ValueError:
+            delay = None
 
-    def generate_text(self, prompt: str, system_prompt: str = "You are a helpful assistant.", model: str = "llama-3.1-8b-instant") -> str:
+        if delay is None:
+            delay = random.uniform(0, min(settings.LLM_BACKOFF_MAX, settings.LLM_BACKOFF_BASE * 2 ** attempt))
+        else:
+            # Let every process wait out the server's window, then spread the retries
+            self.limiter.cooldown(delay)
+            delay += random.uniform(0, settings.LLM_BACKOFF_BASE)
+
+        reason = "rate limited" if isinstance(error, RateLimitError) else f"request failed ({type(error).__name__})"
+        logger.warning(f"Groq {reason} (attempt {attempt + 1}), retrying in {delay:.1f}s")
+        return delay
+
+    def _complete(self, prompt: str, system_prompt: str, model: str, response_format: str = None, cache_site: str = None, priority: str = PRIORITY_INTERACTIVE) -> str:
+        """
+        Runs one chat completion. `cache_site` names the caller; the response cache is
+        only consulted when that site is enabled in LLM_CACHE_SITES. `priority` decides
+        whether the call may use the rate limit headroom reserved for interactive queries.
+        """
         if not self.client:
             raise ValueError("Groq client not initialized")
-            
-        response = self.client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt}
-            ],
-            model=model
-        )
-        return response.choices[0].message.content
+
+        key, cached = self._cache_lookup(cache_site, model, system_prompt, prompt, response_format)
+        if cached is not None:
+            return cached
+
+        request = self._request(prompt, system_prompt, model, response_format)
+        tokens = self.limiter.estimate_tokens(system_prompt, prompt)
+
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            self.limiter.acquire(tokens, priority)
+            start = time.perf_counter()
+            try:
+                response = self.client.chat.completions.create(**request)
+                break
+            except RETRYABLE_ERRORS as e:
+                if attempt == settings.LLM_MAX_RETRIES:
+                    raise
+                time.sleep(self._backoff(e, attempt))
+
+        content = response.choices[0].message.content
+        if key and content:
+            self.cache.set(key, content, time.perf_counter() - start)
+        return content
+
+    async def _acomplete(self, prompt: str, system_prompt: str, model: str, response_format: str = None, cache_site: str = None, priority: str = PRIORITY_INTERACTIVE) -> str:
+        """AsyncGroq counterpart of `_complete`."""
+        if not self.async_client:
+            raise ValueError("Groq client not initialized")
+
+        key, cached = await asyncio.to_thread(self._cache_lookup, cache_site, model, system_prompt, prompt, response_format)
+        if cached is not None:
+            return cached
+
+        request = self._request(prompt, system_prompt, model, response_format)
+        tokens = self.limiter.estimate_tokens(system_prompt, prompt)
+
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            await self.limiter.acquire_async(tokens, priority)
+            start = time.perf_counter()
+            try:
+                response = await self.async_client.chat.completions.create(**request)
+                break
+            except RETRYABLE_ERRORS as e:
+                if attempt == settings.LLM_MAX_RETRIES:
+                    raise
+                await asyncio.sleep(self._backoff(e, attempt))
+
+        content = response.choices[0].message.content
+        if key and content:
+            await asyncio.to_thread(self.cache.set, key, content, time.perf_counter() - start)
+        return content
+
+    async def astream_text(self, prompt: str, system_prompt: str = "You are a helpful assistant.", model: str = "llama-3.1-8b-instant", priority: str = PRIORITY_INTERACTIVE):
+        """
+        Streams completion tokens as they arrive. Streams are never cached; errors are
+        retried only before the first token, since the stream cannot be resumed.
+        """
+        if not self.async_client:
+            raise ValueError("Groq client not initialized")
+
+        request = self._request(prompt, system_prompt, model)
+        tokens = self.limiter.estimate_tokens(system_prompt, prompt)
+
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            await self.limiter.acquire_async(tokens, priority)
+            try:
+                stream = await self.async_client.chat.completions.create(**request, stream=True)
+                break
+            except RETRYABLE_ERRORS as e:
+                if attempt == settings.LLM_MAX_RETRIES:
+                    raise
+                await asyncio.sleep(self._backoff(e, attempt))
+
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
 
 llm_provider = LLMProvider()
@@ -2,9 +2,57 @@ import logging
 import re
 from neo4j import GraphDatabase
 from core.config import settings
+from infrastructure.graph_snapshot_cache import graph_snapshots
 
 logger = logging.getLogger(__name__)
 
+FULLTEXT_INDEX = "entity_text"
+
+# Provenance entry of elements written before document_ids existed. No document can remove
+# it, so such an element outlives every document later merged onto it.
+LEGACY_PROVENANCE = "legacy"
+
+# Applied in order by init_db. The highest applied version is stored on a :SchemaVersion
+# node, so every step runs once per database; add new steps instead of editing old ones.
+SCHEMA_MIGRATIONS = [
+    (1, [
+        """
+        CREATE CONSTRAINT entity_workspace_name_unique IF NOT EXISTS
+        FOR (e:Entity) REQUIRE (e.name, e.workspace_id) IS UNIQUE
+        """
+    ]),
+    (2, [
+        "CREATE RANGE INDEX entity_workspace IF NOT EXISTS FOR (e:Entity) ON (e.workspace_id)",
+        "CREATE RANGE INDEX entity_workspace_name_lower IF NOT EXISTS FOR (e:Entity) ON (e.workspace_id, e.name_lower)",
+        # Backfill the stored lower-cased name that retrieve_context looks up
+        """
+        MATCH (e:Entity) WHERE e.name_lower IS NULL OR e.name_lower <> toLower(e.name)
+        CALL { WITH e SET e.name_lower = toLower(e.name) } IN TRANSACTIONS OF 10000 ROWS
+        """
+    ]),
+    (3, [
+        f"""
+        CREATE FULLTEXT INDEX {FULLTEXT_INDEX} IF NOT EXISTS
+        FOR (e:Entity) ON EACH [e.name, e.description, e.workspace_id]
+        """
+    ]),
+    (4, [
+        # Serves the keyset-paginated graph export in name order
+        "CREATE RANGE INDEX entity_workspace_name IF NOT EXISTS FOR (e:Entity) ON (e.workspace_id, e.name)"
+    ]),
+    (5, [
+        # Elements from before provenance tracking belong to no removable document
+        f"""
+        MATCH (e:Entity) WHERE e.document_ids IS NULL
+        CALL {{ WITH e SET e.document_ids = ['{LEGACY_PROVENANCE}'] }} IN TRANSACTIONS OF 10000 ROWS
+        """,
+        f"""
+        MATCH (:Entity)-[r]->(:Entity) WHERE r.document_ids IS NULL
+        CALL {{ WITH r SET r.document_ids = ['{LEGACY_PROVENANCE}'] }} IN TRANSACTIONS OF 10000 ROWS
+        """
+    ]),
+]
+
 class Neo4jAdapter:
     def __init__(self):
         if not settings.NEO4J_URI:
@@ -16,6 +64,7 @@ class Neo4jAdapter:
         self.user = settings.NEO4J_USER
         self.password = settings.NEO4J_PASSWORD
         self.database = settings.NEO4J_DATABASE
+        self.batch_size = settings.NEO4J_WRITE_BATCH_SIZE
         
         self.driver = GraphDatabase.driver(
             self.uri, 
@@ -28,17 +77,31 @@ class Neo4jAdapter:
         if self.driver:
             self.driver.close()
 
+    @staticmethod
+    def _graph_changed(workspace_id: str):
+        """Bumps the workspace graph version, retiring cached snapshots and ETags."""
+        if graph_snapshots:
+            graph_snapshots.bump(workspace_id)
+
     def init_db(self):
-        """Initializes database constraints and verifies connectivity."""
+        """Verifies connectivity and applies any schema migrations this database has not seen yet."""
         if not self.driver: return
         try:
             with self.driver.session(database=self.database) as session:
                 session.run("RETURN 1")
-                session.run("""
-                    CREATE CONSTRAINT entity_workspace_name_unique IF NOT EXISTS
-                    FOR (e:Entity) REQUIRE (e.name, e.workspace_id) IS UNIQUE
-                """)
-            logger.info("Neo4j initialized successfully with constraints.")
+                record = session.run("MATCH (v:SchemaVersion {id: 'entity'}) RETURN v.version AS version").single()
+                current = record["version"] if record else 0
+
+                for version, statements in SCHEMA_MIGRATIONS:
+                    if version <= current:
+                        continue
+                    for statement in statements:
+                        session.run(statement).consume()
+                    session.run("MERGE (v:SchemaVersion {id: 'entity'}) SET v.version = $version", version=version).consume()
+                    logger.info(f"Applied Neo4j schema version {version}")
+
+                session.run("CALL db.awaitIndexes(300)").consume()
+            logger.info("Neo4j initialized successfully with constraints and indexes.")
         except Exception as e:
             logger.error(f"Failed to initialize Neo4j: {e}")
             raise
@@ -49,67 +112,233 @@ class Neo4jAdapter:
         rel_type = re.sub(r'[^A-Z0-9_]', '', rel_type)
         return rel_type if rel_type else "RELATED_TO"
 
-    def create_graph(self, workspace_id: str, entities: list, relationships: list):
-        """Creates entities and relationships in Neo4j idempotently."""
-        if not self.driver: return
+    def create_graph(self, workspace_id: str, entities: list, relationships: list, document_id: str = None) -> int:
+        """
+        Creates entities and relationships in Neo4j idempotently. Returns the number of new entities.
+        When `document_id` is given it is added to the `document_ids` provenance list of every
+        node and relationship written, so the document's contribution can be removed later.
+        """
+        if not self.driver: return 0
 
         # Idempotent node creation
-        node_query = """
+        node_query = f"""
         UNWIND $entities AS entity
-        MERGE (e:Entity {name: entity.name, workspace_id: $workspace_id})
-        ON CREATE SET e.type = entity.type, e.description = COALESCE(entity.description, "")
-        ON MATCH SET e.type = entity.type, e.description = COALESCE(entity.description, "")
+        MERGE (e:Entity {{name: entity.name, workspace_id: $workspace_id}})
+        ON CREATE SET e.type = entity.type, e.description = COALESCE(entity.description, ""), e.name_lower = toLower(entity.name)
+        ON MATCH SET e.type = entity.type, e.description = COALESCE(entity.description, ""),
+            e.document_ids = COALESCE(e.document_ids, ['{LEGACY_PROVENANCE}'])
+        {self._provenance_clause("e")}
         """
-        
-        sanitized_rels = []
+
+        rels_by_type = self._group_rels_by_type(relationships)
+        nodes_created = 0
+
+        with self.driver.session(database=self.database) as session:
+            for batch in self._batches(entities, self.batch_size):
+                nodes_created += session.execute_write(
+                    lambda tx, b=batch: tx.run(
+                        node_query, entities=b, workspace_id=workspace_id, document_id=document_id
+                    ).consume().counters.nodes_created
+                )
+
+            for rel_type, rels in rels_by_type.items():
+                rel_query = self._rel_batch_query(rel_type)
+                for batch in self._batches(rels, self.batch_size):
+                    session.execute_write(
+                        lambda tx, q=rel_query, b=batch: tx.run(q, rels=b, workspace_id=workspace_id, document_id=document_id)
+                    )
+
+        if entities or relationships:
+            self._graph_changed(workspace_id)
+        return nodes_created
+
+    def _group_rels_by_type(self, relationships: list) -> dict:
+        """Groups relationships by sanitized type, since Cypher cannot parameterise a relationship type."""
+        grouped = {}
         for rel in relationships:
-            sanitized_rels.append({
+            rel_type = self.sanitize_rel_type(rel["type"])
+            grouped.setdefault(rel_type, []).append({
                 "source": rel["source"],
-                "target": rel["target"],
-                "type": self.sanitize_rel_type(rel["type"])
+                "target": rel["target"]
             })
+        return grouped
 
-        def _create_rels_tx(tx, w_id, rels):
-            for rel in rels:
-                # Idempotent relationship creation using MERGE
-                rel_query = f"""
-                MATCH (a:Entity {{name: $source, workspace_id: $workspace_id}})
-                MATCH (b:Entity {{name: $target, workspace_id: $workspace_id}})
-                MERGE (a)-[r:{rel['type']}]->(b)
-                SET r.workspace_id = $workspace_id
-                """
-                tx.run(rel_query, source=rel["source"], target=rel["target"], workspace_id=w_id)
+    @classmethod
+    def _rel_batch_query(cls, rel_type: str) -> str:
+        # rel_type has already gone through sanitize_rel_type, so it is safe to interpolate
+        return f"""
+        UNWIND $rels AS rel
+        MATCH (a:Entity {{name: rel.source, workspace_id: $workspace_id}})
+        MATCH (b:Entity {{name: rel.target, workspace_id: $workspace_id}})
+        MERGE (a)-[r:{rel_type}]->(b)
+        ON MATCH SET r.document_ids = COALESCE(r.document_ids, ['{LEGACY_PROVENANCE}'])
+        SET r.workspace_id = $workspace_id
+        {cls._provenance_clause("r")}
+        """
+
+    @staticmethod
+    def _provenance_clause(var: str) -> str:
+        """Appends $document_id to the element's document_ids list once."""
+        return f"""
+        SET {var}.document_ids = CASE
+            WHEN $document_id IS NULL OR $document_id IN COALESCE({var}.document_ids, []) THEN {var}.document_ids
+            ELSE COALESCE({var}.document_ids, []) + $document_id
+        END
+        """
 
+    @staticmethod
+    def _provenance_union(target: str, source: str) -> str:
+        """Cypher expression: target's document_ids plus source's, a missing list counting as legacy."""
+        target_ids = f"COALESCE({target}.document_ids, ['{LEGACY_PROVENANCE}'])"
+        source_ids = f"COALESCE({source}.document_ids, ['{LEGACY_PROVENANCE}'])"
+        return f"{target_ids} + [d IN {source_ids} WHERE NOT d IN {target_ids}]"
+
+    def remove_document(self, workspace_id: str, document_id: str) -> dict:
+        """
+        Removes one document's contribution to the workspace graph. The document is dropped from
+        every provenance list, and nodes or relationships left with no contributing document are
+        deleted. Runs in transactions of at most NEO4J_WRITE_BATCH_SIZE elements.
+        Elements written before provenance tracking carry the legacy entry, so they are never deleted.
+        """
+        if not self.driver: return {"nodes_deleted": 0, "relationships_deleted": 0}
+
+        rel_query = """
+        MATCH (:Entity {workspace_id: $workspace_id})-[r]->(:Entity {workspace_id: $workspace_id})
+        WHERE $document_id IN r.document_ids
+        WITH r LIMIT $batch_size
+        SET r.document_ids = [d IN r.document_ids WHERE d <> $document_id]
+        WITH r, size(r.document_ids) = 0 AS orphaned
+        FOREACH (_ IN CASE WHEN orphaned THEN [1] ELSE [] END | DELETE r)
+        RETURN count(*) AS touched
+        """
+
+        node_query = """
+        MATCH (e:Entity {workspace_id: $workspace_id})
+        WHERE $document_id IN e.document_ids
+        WITH e LIMIT $batch_size
+        SET e.document_ids = [d IN e.document_ids WHERE d <> $document_id]
+        WITH e, size(e.document_ids) = 0 AS orphaned
+        FOREACH (_ IN CASE WHEN orphaned THEN [1] ELSE [] END | DETACH DELETE e)
+        RETURN count(*) AS touched
+        """
+
+        def _run_batch(tx, query):
+            result = tx.run(query, workspace_id=workspace_id, document_id=document_id, batch_size=self.batch_size)
+            touched = result.single()["touched"]
+            counters = result.consume().counters
+            return touched, counters.nodes_deleted, counters.relationships_deleted
+
+        totals = {"nodes_deleted": 0, "relationships_deleted": 0}
         with self.driver.session(database=self.database) as session:
-            session.execute_write(lambda tx: tx.run(node_query, entities=entities, workspace_id=workspace_id))
-            session.execute_write(_create_rels_tx, workspace_id, sanitized_rels)
+            # Relationships first, so node batches mostly delete already-detached nodes
+            for query in (rel_query, node_query):
+                while True:
+                    touched, nodes_deleted, rels_deleted = session.execute_write(_run_batch, query)
+                    totals["nodes_deleted"] += nodes_deleted
+                    totals["relationships_deleted"] += rels_deleted
+                    if touched < self.batch_size:
+                        break
+
+        # Provenance lists changed even when nothing was deleted, but the exported graph did not
+        if totals["nodes_deleted"] or totals["relationships_deleted"]:
+            self._graph_changed(workspace_id)
+        logger.info(f"Removed document {document_id} from graph: {totals}")
+        return totals
+
+    @staticmethod
+    def _batches(items: list, size: int):
+        for i in range(0, len(items), size):
+            yield items[i:i + size]
 
     def get_workspace_graph(self, workspace_id):
+        """Whole graph as {"nodes", "edges"}, read in keyset pages rather than one collect()."""
         if not self.driver: return {"nodes": [], "edges": []}
+        nodes, edges = [], []
+        for kind, item in self.iter_workspace_graph(workspace_id):
+            (nodes if kind == "node" else edges).append(item)
+        return {"nodes": nodes, "edges": edges}
+
+    def get_nodes_page(self, workspace_id: str, after: str = None, limit: int = 1000) -> list[dict]:
+        """Nodes in name order, starting after the node named `after`."""
+        if not self.driver: return []
         query = """
-        MATCH (n:Entity {workspace_id: $workspace_id})
-        OPTIONAL MATCH (n)-[r]->(m:Entity {workspace_id: $workspace_id})
-        WITH n, r, m
-        RETURN 
-            collect(DISTINCT {
-                id: n.name,
-                label: n.name,
-                type: n.type,
-                description: n.description
-            }) AS nodes,
-            collect(DISTINCT CASE WHEN r IS NOT NULL THEN {
-                source: n.name,
-                target: m.name,
-                label: type(r)
-            } END) AS edges
+        MATCH (n:Entity)
+        WHERE n.workspace_id = $workspace_id AND n.name > $after
+        RETURN n.name AS id, n.name AS label, n.type AS type, n.description AS description
+        ORDER BY n.name
+        LIMIT $limit
+        """
+        with self.driver.session(database=self.database) as session:
+            result = session.run(query, workspace_id=workspace_id, after=after or "", limit=limit)
+            return [record.data() for record in result]
+
+    def get_edges_page(self, workspace_id: str, after: tuple = None, limit: int = 1000) -> list[dict]:
+        """
+        Edges ordered by (source name, relationship element id), starting after the
+        `after` key. Each returned edge carries its `key` for use as the next cursor.
+        """
+        if not self.driver: return []
+        after_source, after_rel = after or ("", "")
+        query = """
+        MATCH (n:Entity)
+        WHERE n.workspace_id = $workspace_id AND n.name >= $after_source
+        MATCH (n)-[r]->(m:Entity {workspace_id: $workspace_id})
+        WITH n, r, m, elementId(r) AS rel_id
+        WHERE n.name > $after_source OR rel_id > $after_rel
+        RETURN n.name AS source, m.name AS target, type(r) AS label, rel_id
+        ORDER BY n.name, rel_id
+        LIMIT $limit
+        """
+        with self.driver.session(database=self.database) as session:
+            result = session.run(
+                query, workspace_id=workspace_id, after_source=after_source, after_rel=after_rel, limit=limit
+            )
+            edges = []
+            for record in result:
+                edge = record.data()
+                edge["key"] = (edge["source"], edge.pop("rel_id"))
+                edges.append(edge)
+            return edges
+
+    def iter_workspace_graph(self, workspace_id: str, page_size: int = None):
         """
+        Yields ("node", node) for every node, then ("edge", edge) for every edge, one keyset
+        page at a time, so memory stays bounded by the page size whatever the graph size.
+        """
+        if not self.driver: return
+        page_size = page_size or self.batch_size
+
+        after = None
+        while True:
+            nodes = self.get_nodes_page(workspace_id, after, page_size)
+            for node in nodes:
+                yield "node", node
+            if len(nodes) < page_size:
+                break
+            after = nodes[-1]["id"]
+
+        after = None
+        while True:
+            edges = self.get_edges_page(workspace_id, after, page_size)
+            for edge in edges:
+                after = edge.pop("key")
+                yield "edge", edge
+            if len(edges) < page_size:
+                break
+
+    def count_entities(self, workspace_id: str) -> int:
+        """Entities in the workspace, counted through the workspace_id range index."""
+        if not self.driver: return 0
+        query = "MATCH (e:Entity) WHERE e.workspace_id = $workspace_id RETURN count(e) AS count"
+        with self.driver.session(database=self.database) as session:
+            return session.run(query, workspace_id=workspace_id).single()["count"]
+
+    def get_entity_names(self, workspace_id: str) -> list[str]:
+        if not self.driver: return []
+        query = "MATCH (n:Entity {workspace_id: $workspace_id}) RETURN n.name AS name"
         with self.driver.session(database=self.database) as session:
             result = session.run(query, workspace_id=workspace_id)
-            record = result.single()
-            if not record: return {"nodes": [], "edges": []}
-            nodes = record["nodes"] or []
-            edges = [e for e in record["edges"] if e is not None]
-            return {"nodes": nodes, "edges": edges}
+            return [record["name"] for record in result if record["name"]]
 
     def merge_entities(self, workspace_id: str, keep_name: str, delete_name: str):
         if not self.driver: return
@@ -126,25 +355,37 @@ class Neo4jAdapter:
             if delete_name not in names_found:
                 raise ValueError(f"Source entity '{delete_name}' not found.")
 
-            query = """
-            MATCH (keep:Entity {name: $keep_name, workspace_id: $workspace_id})
-            MATCH (delete:Entity {name: $delete_name, workspace_id: $workspace_id})
+            # Provenance is unioned onto the kept node and onto every relationship it takes over,
+            # so removing any contributing document later still leaves the merged elements
+            query = f"""
+            MATCH (keep:Entity {{name: $keep_name, workspace_id: $workspace_id}})
+            MATCH (delete:Entity {{name: $delete_name, workspace_id: $workspace_id}})
+            SET keep.document_ids = {self._provenance_union("keep", "delete")}
             WITH keep, delete
             OPTIONAL MATCH (delete)-[r_out]->(target) WHERE target <> keep
-            WITH keep, delete, collect({r: r_out, target: target}) as out_items
-            CALL apoc.cypher.doIt("UNWIND $items as item WITH item WHERE item.r IS NOT NULL CALL apoc.merge.relationship($keep, type(item.r), properties(item.r), {workspace_id: $wid}, item.target) YIELD rel DELETE item.r RETURN count(*) as c", {items: out_items, keep: keep, wid: $workspace_id}) YIELD value as v1
+            WITH keep, delete, collect({{r: r_out, target: target}}) as out_items
+            CALL apoc.cypher.doIt("UNWIND $items as item WITH item WHERE item.r IS NOT NULL CALL apoc.merge.relationship($keep, type(item.r), {{}}, properties(item.r), item.target, {{}}) YIELD rel SET rel.workspace_id = $wid, rel.document_ids = {self._provenance_union("rel", "item.r")} DELETE item.r RETURN count(*) as c", {{items: out_items, keep: keep, wid: $workspace_id}}) YIELD value as v1
             WITH keep, delete
             OPTIONAL MATCH (source)-[r_in]->(delete) WHERE source <> keep
-            WITH keep, delete, collect({r: r_in, source: source}) as in_items
-            CALL apoc.cypher.doIt("UNWIND $items as item WITH item WHERE item.r IS NOT NULL CALL apoc.merge.relationship(item.source, type(item.r), properties(item.r), {workspace_id: $wid}, $keep) YIELD rel DELETE item.r RETURN count(*) as c", {items: in_items, keep: keep, wid: $workspace_id}) YIELD value as v2
+            WITH keep, delete, collect({{r: r_in, source: source}}) as in_items
+            CALL apoc.cypher.doIt("UNWIND $items as item WITH item WHERE item.r IS NOT NULL CALL apoc.merge.relationship(item.source, type(item.r), {{}}, properties(item.r), $keep, {{}}) YIELD rel SET rel.workspace_id = $wid, rel.document_ids = {self._provenance_union("rel", "item.r")} DELETE item.r RETURN count(*) as c", {{items: in_items, keep: keep, wid: $workspace_id}}) YIELD value as v2
             WITH delete DETACH DELETE delete
             """
             try:
                 session.execute_write(lambda tx: tx.run(query, keep_name=keep_name, delete_name=delete_name, workspace_id=workspace_id))
             except Exception as e:
                 logger.error(f"Merge operation failed via APOC: {e}")
-                fallback_query = "MATCH (delete:Entity {name: $delete_name, workspace_id: $workspace_id}) DETACH DELETE delete"
-                session.execute_write(lambda tx: tx.run(fallback_query, delete_name=delete_name, workspace_id=workspace_id))
+                fallback_query = f"""
+                MATCH (keep:Entity {{name: $keep_name, workspace_id: $workspace_id}})
+                MATCH (delete:Entity {{name: $delete_name, workspace_id: $workspace_id}})
+                SET keep.document_ids = {self._provenance_union("keep", "delete")}
+                DETACH DELETE delete
+                """
+                session.execute_write(lambda tx: tx.run(
+                    fallback_query, keep_name=keep_name, delete_name=delete_name, workspace_id=workspace_id
+                ))
+
+        self._graph_changed(workspace_id)
 
     def edit_entity(self, workspace_id: str, old_name: str, new_name: str, new_type: str, new_desc: str):
         if not self.driver: return
@@ -156,34 +397,58 @@ class Neo4jAdapter:
                     raise ValueError(f"Entity with name '{new_name}' already exists.")
             update_query = """
             MATCH (e:Entity {name: $old_name, workspace_id: $workspace_id})
-            SET e.name = $new_name, e.type = $new_type, e.description = $new_desc
+            SET e.name = $new_name, e.name_lower = toLower($new_name), e.type = $new_type, e.description = $new_desc
             """
             session.execute_write(lambda tx: tx.run(
                 update_query, old_name=old_name, new_name=new_name, new_type=new_type, new_desc=new_desc, workspace_id=workspace_id
             ))
 
-    def retrieve_context(self, workspace_id: str, entity_names: list, limit: int = 50):
+        self._graph_changed(workspace_id)
+
+    @staticmethod
+    def _fulltext_phrase(text: str) -> str:
+        return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+    def retrieve_context(self, workspace_id: str, entity_names: list, limit: int = 50, candidate_limit: int = 100):
+        """
+        Finds the workspace entities named in `entity_names`, plus entities whose name contains
+        one of them as a phrase, with their connections. Exact names are looked up through the
+        (workspace_id, name_lower) range index and partial ones through the full-text index,
+        so neither branch scans the workspace's entities.
+        """
         if not self.driver:
             return []
 
-        entity_names = [e.lower() for e in entity_names]
+        entity_names = sorted({e.lower().strip() for e in entity_names if e and e.strip()})
+        if not entity_names:
+            return []
 
-        query = """
-        MATCH (n:Entity {workspace_id: $workspace_id})
-        WHERE 
-            toLower(n.name) IN $entity_names
-            OR any(name IN $entity_names WHERE toLower(n.name) CONTAINS name)
+        fulltext_query = (
+            f"+workspace_id:{self._fulltext_phrase(workspace_id)} "
+            f"+name:({' '.join(self._fulltext_phrase(name) for name in entity_names)})"
+        )
+
+        query = f"""
+        CALL {{
+            MATCH (n:Entity)
+            WHERE n.workspace_id = $workspace_id AND n.name_lower IN $entity_names
+            RETURN n
+            UNION
+            CALL db.index.fulltext.queryNodes('{FULLTEXT_INDEX}', $fulltext_query, {{limit: $candidate_limit}}) YIELD node
+            RETURN node AS n
+        }}
+        WITH n WHERE n.workspace_id = $workspace_id
 
-        OPTIONAL MATCH (n)-[r]-(m:Entity {workspace_id: $workspace_id})
+        OPTIONAL MATCH (n)-[r]-(m:Entity {{workspace_id: $workspace_id}})
 
         RETURN 
             n.name AS entity,
             n.type AS type,
             n.description AS description,
-            collect(DISTINCT {
+            collect(DISTINCT {{
                 rel: type(r),
                 connected_to: m.name
-            })[0..$limit] AS connections
+            }})[0..$limit] AS connections
         """
 
         with self.driver.session(database=self.database) as session:
@@ -191,6 +456,8 @@ class Neo4jAdapter:
                 query,
                 workspace_id=workspace_id,
                 entity_names=entity_names,
+                fulltext_query=fulltext_query,
+                candidate_limit=candidate_limit,
                 limit=limit
             )
 
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import time
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BACKGROUND = "background"
+
+# Two token buckets (requests/min and tokens/min) refilled continuously and updated atomically.
+# Background callers may not draw a bucket below `reserve` of its capacity, which keeps that
+# headroom free for interactive queries. A cooldown key set after a 429 pauses every caller.
+# Returns 0 when the request was admitted, otherwise the suggested wait in milliseconds.
+TOKEN_BUCKET_LUA = """
+local now = tonumber(ARGV[1])
+local req_cap = tonumber(ARGV[2])
+local tok_cap = tonumber(ARGV[3])
+local req_cost = tonumber(ARGV[4])
+local tok_cost = tonumber(ARGV[5])
+local reserve = tonumber(ARGV[6])
+
+local cooldown = redis.call('PTTL', KEYS[3])
+if cooldown > 0 then
+  return cooldown
+end
+
+local function level(key, cap)
+  local data = redis.call('HMGET', key, 'tokens', 'ts')
+  local tokens = tonumber(data[1]) or cap
+  local ts = tonumber(data[2]) or now
+  return math.min(cap, tokens + (now - ts) * cap / 60000)
+end
+
+local req = level(KEYS[1], req_cap)
+local tok = level(KEYS[2], tok_cap)
+local req_floor = req_cap * reserve
+local tok_floor = tok_cap * reserve
+
+local admitted = req - req_cost >= req_floor and tok - tok_cost >= tok_floor
+if admitted then
+  req = req - req_cost
+  tok = tok - tok_cost
+end
+
+redis.call('HSET', KEYS[1], 'tokens', req, 'ts', now)
+redis.call('HSET', KEYS[2], 'tokens', tok, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], 120000)
+redis.call('PEXPIRE', KEYS[2], 120000)
+
+if admitted then
+  return 0
+end
+
+local req_wait = (req_cost + req_floor - req) * 60000 / req_cap
+local tok_wait = (tok_cost + tok_floor - tok) * 60000 / tok_cap
+return math.max(1, math.ceil(math.max(req_wait, tok_wait)))
+"""
+
+
+class RateLimiter:
+    """
+    Process-shared Groq rate limiter backed by Redis. Without Redis it admits everything,
+    leaving 429 handling to the provider's backoff.
+    """
+
+    def __init__(self, redis_conn, requests_per_min: int, tokens_per_min: int, background_reserve: float):
+        self.redis = redis_conn
+        self.requests_per_min = requests_per_min
+        self.tokens_per_min = tokens_per_min
+        self.background_reserve = background_reserve
+        self.keys = ["llm:rl:requests", "llm:rl:tokens", "llm:rl:cooldown"]
+        self.script = redis_conn.register_script(TOKEN_BUCKET_LUA) if redis_conn else None
+
+    @staticmethod
+    def estimate_tokens(*texts: str, completion_tokens: int = 512) -> int:
+        """Rough prompt size (~4 chars per token) plus an allowance for the completion."""
+        return sum(len(t) for t in texts if t) // 4 + completion_tokens
+
+    def _try_acquire(self, tokens: int, priority: str) -> float:
+        """Returns 0 when admitted, otherwise seconds to wait before retrying."""
+        if not self.script:
+            return 0
+
+        reserve = self.background_reserve if priority == PRIORITY_BACKGROUND else 0.0
+        # A request larger than the usable bucket could never be admitted; clamp it
+        tokens = min(tokens, int(self.tokens_per_min * (1 - reserve)))
+
+        try:
+            wait_ms = self.script(
+                keys=self.keys,
+                args=[int(time.time() * 1000), self.requests_per_min, self.tokens_per_min, 1, tokens, reserve]
+            )
+        except Exception as e:
+            logger.warning(f"Rate limiter unavailable, admitting request: {e}")
+            return 0
+        return int(wait_ms) / 1000
+
+    def acquire(self, tokens: int, priority: str = PRIORITY_INTERACTIVE):
+        while True:
+            wait = self._try_acquire(tokens, priority)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int, priority: str = PRIORITY_INTERACTIVE):
+        while True:
+            wait = await asyncio.to_thread(self._try_acquire, tokens, priority)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def cooldown(self, seconds: float):
+        """Pauses all processes after a 429, e.g. for the server's Retry-After."""
+        if not self.redis or seconds <= 0:
+            return
+        try:
+            self.redis.set(self.keys[2], 1, px=int(seconds * 1000))
+        except Exception as e:
+            logger.warning(f"Failed to set rate limit cooldown: {e}")
+
+
+def build_rate_limiter() -> RateLimiter:
+    redis_conn = None
+    if settings.LLM_RATE_LIMIT_ENABLED:
+        from infrastructure.redis_adapter import redis_adapter
+        redis_conn = redis_adapter.redis_conn
+        if not redis_conn:
+            logger.warning("LLM rate limiting needs Redis; continuing without a shared limiter")
+
+    return RateLimiter(
+        redis_conn,
+        requests_per_min=settings.LLM_REQUESTS_PER_MIN,
+        tokens_per_min=settings.LLM_TOKENS_PER_MIN,
+        background_reserve=settings.LLM_BACKGROUND_RESERVE
+    )
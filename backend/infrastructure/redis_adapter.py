@@ -1,6 +1,6 @@
 import logging
 from redis import Redis
-from rq import Queue
+from rq import Queue, Retry
 from core.config import settings
 
 logger = logging.getLogger(__name__)
@@ -22,6 +22,11 @@ class RedisAdapter:
             self.redis_conn = None
             self.queue = None
 
+    @staticmethod
+    def job_retry():
+        # Ingestion writes are idempotent, so a job that failed on e.g. exhausted 429 retries can rerun
+        return Retry(max=2, interval=[60, 300])
+
     def enqueue_job(self, func, *args, **kwargs):
         if not self.queue:
             raise RuntimeError("Redis queue is not configured")
@@ -32,8 +37,30 @@ class RedisAdapter:
             **kwargs,
             job_timeout='30m', 
             failure_ttl=86400,
-            retry=None
+            retry=self.job_retry()
         )
         return job
 
+    def enqueue_many(self, func, job_specs: list[dict], meta: dict = None):
+        """
+        Enqueues several jobs in one Redis pipeline.
+        Each spec is {"job_id": str, "kwargs": dict}; `meta` is attached to every job.
+        """
+        if not self.queue:
+            raise RuntimeError("Redis queue is not configured")
+
+        jobs_data = [
+            Queue.prepare_data(
+                func,
+                kwargs=spec["kwargs"],
+                job_id=spec["job_id"],
+                timeout='30m',
+                failure_ttl=86400,
+                meta=meta,
+                retry=self.job_retry()
+            )
+            for spec in job_specs
+        ]
+        return self.queue.enqueue_many(jobs_data)
+
 redis_adapter = RedisAdapter()
@@ -1,9 +1,20 @@
+import json
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from supabase import create_client, Client
+from tenacity import retry, stop_after_attempt, wait_exponential_jitter, before_sleep_log
 from core.config import settings
-import logging
 
 logger = logging.getLogger(__name__)
 
+def encode_vector(vector) -> str:
+    """
+    pgvector text literal with float32 precision. Much smaller than the default JSON
+    float64 repr of each component, and parsed directly by the vector column.
+    """
+    return "[" + ",".join(f"{x:.7g}" for x in vector) + "]"
+
 class SupabaseAdapter:
     def __init__(self):
         if not settings.SUPABASE_URL or not settings.SUPABASE_SERVICE_ROLE_KEY:
@@ -40,13 +51,64 @@ class SupabaseAdapter:
         }).execute()
         return res.data[0]
 
-    def create_document(self, user_id: str, workspace_id: str, file_name: str, status: str = "pending", job_id: str = None):
+    def create_document(self, user_id: str, workspace_id: str, file_name: str, status: str = "pending", job_id: str = None, content_hash: str = None, storage_path: str = None):
         res = self.client.table("documents").insert({
             "user_id": user_id, "workspace_id": workspace_id, "file_name": file_name, 
-            "status": status, "job_id": job_id
+            "status": status, "job_id": job_id, "content_hash": content_hash, "storage_path": storage_path
         }).execute()
         return res.data[0]
 
+    def update_document(self, document_id: str, fields: dict):
+        res = self.client.table("documents").update(fields).eq("id", document_id).execute()
+        return res.data
+
+    def delete_document(self, document_id: str):
+        res = self.client.table("documents").delete().eq("id", document_id).execute()
+        return res.data
+
+    def find_document_by_hash(self, workspace_id: str, content_hash: str, exclude_id: str = None):
+        """Returns a completed document in the workspace with the same content hash that holds its own data, if any."""
+        query = self.client.table("documents").select("*") \
+            .eq("workspace_id", workspace_id).eq("content_hash", content_hash).eq("status", "completed") \
+            .is_("duplicate_of", "null")
+        if exclude_id:
+            query = query.neq("id", exclude_id)
+        res = query.limit(1).execute()
+        return res.data[0] if res.data else None
+
+    def find_documents_by_hashes(self, workspace_id: str, content_hashes: list[str]) -> dict:
+        """Returns {content_hash: document} for completed documents in the workspace that hold their own data."""
+        if not content_hashes: return {}
+        res = self.client.table("documents").select("*") \
+            .eq("workspace_id", workspace_id).eq("status", "completed").is_("duplicate_of", "null") \
+            .in_("content_hash", content_hashes).execute()
+        return {d["content_hash"]: d for d in res.data or []}
+
+    def get_duplicates_of(self, document_id: str):
+        """Documents recorded as duplicates of `document_id`, oldest first."""
+        res = self.client.table("documents").select("*").eq("duplicate_of", document_id).order("created_at").execute()
+        return res.data or []
+
+    def create_documents(self, rows: list[dict]):
+        """Bulk insert of document rows in a single request."""
+        res = self.client.table("documents").insert(rows).execute()
+        return res.data
+
+    def get_batch_documents(self, batch_id: str, user_id: str):
+        res = self.client.table("documents").select("id, file_name, status, job_id, error") \
+            .eq("batch_id", batch_id).eq("user_id", user_id).execute()
+        return res.data
+
+    def update_batch_status(self, batch_id: str, status: str, error: str = None):
+        update_data = {"status": status}
+        if error is not None: update_data["error"] = error
+        res = self.client.table("documents").update(update_data).eq("batch_id", batch_id).execute()
+        return res.data
+
+    def set_document_hash(self, document_id: str, content_hash: str):
+        res = self.client.table("documents").update({"content_hash": content_hash}).eq("id", document_id).execute()
+        return res.data
+
     def update_document_job(self, document_id: str, status: str, job_id: str = None, error: str = None):
         update_data = {"status": status}
         if job_id: update_data["job_id"] = job_id
@@ -55,18 +117,35 @@ class SupabaseAdapter:
         res = self.client.table("documents").update(update_data).eq("id", document_id).execute()
         return res.data
 
-    def update_workspace_stats(self, workspace_id: str, user_id: str, doc_count: int, entity_count: int):
+    def set_workspace_entity_count(self, workspace_id: str, user_id: str, entity_count: int):
         res = self.client.table("workspaces").update({
-            "doc_count": doc_count, "entity_count": entity_count, "updated_at": "now()"
+            "entity_count": entity_count, "updated_at": "now()"
         }).eq("id", workspace_id).eq("user_id", user_id).execute()
         return res.data
 
+    def increment_workspace_stats(self, workspace_id: str, user_id: str, doc_delta: int = 0, entity_delta: int = 0):
+        """Atomic counter update via RPC, so concurrent jobs don't lose increments."""
+        res = self.client.rpc("increment_workspace_stats", {
+            "p_workspace_id": workspace_id,
+            "p_user_id": user_id,
+            "p_doc_delta": doc_delta,
+            "p_entity_delta": entity_delta
+        }).execute()
+        return res.data
+
     # Storage operations
-    def upload_file(self, file_path: str, storage_path: str):
-        with open(file_path, "rb") as f:
+    def upload_fileobj(self, fileobj, storage_path: str):
+        """Uploads from an open binary file object without copying it to another file first."""
+        # storage3 only streams real file readers, so reopen the underlying descriptor
+        # (a SpooledTemporaryFile rolls over to disk when asked for its fileno)
+        with open(fileobj.fileno(), "rb", closefd=False) as f:
+            f.seek(0)
             res = self.client.storage.from_(self.bucket).upload(storage_path, f)
         return res
 
+    def delete_file(self, storage_path: str):
+        return self.client.storage.from_(self.bucket).remove([storage_path])
+
     def download_file(self, storage_path: str, local_path: str):
         res = self.client.storage.from_(self.bucket).download(storage_path)
         with open(local_path, "wb") as f:
@@ -74,22 +153,114 @@ class SupabaseAdapter:
         return local_path
 
     # Vector operations
-    def store_embeddings(self, document_id: str, workspace_id: str, embeddings_data: list):
-        """Stores a list of dictionaries with content and vector embedding"""
-        if not embeddings_data: return
-        
+    def store_embeddings(self, document_id: str, workspace_id: str, embeddings_data: list) -> int:
+        """
+        Stores a list of dictionaries with content and vector embedding.
+        Rows are written in pages of EMBEDDING_PAGE_SIZE with up to EMBEDDING_PAGE_CONCURRENCY
+        pages in flight. Rows are upserted on (document_id, chunk_index), so retried pages and
+        re-run jobs replace existing chunks instead of appending copies.
+        """
+        if not embeddings_data: return 0
+
         # Add metadata to each chunk
         records = []
         for d in embeddings_data:
             records.append({
                 "document_id": document_id,
                 "workspace_id": workspace_id,
+                "chunk_index": d["chunk_index"],
                 "content": d["content"],
-                "embedding": d["embedding"]
+                "page": d.get("page"),
+                "content_hash": d.get("content_hash"),
+                "embedding": encode_vector(d["embedding"])
             })
-            
-        # Bulk insert
-        self.client.table("document_embeddings").insert(records).execute()
+
+        page_size = settings.EMBEDDING_PAGE_SIZE
+        pages = [records[i:i + page_size] for i in range(0, len(records), page_size)]
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(settings.EMBEDDING_PAGE_CONCURRENCY, len(pages))) as executor:
+            # list() re-raises the first page that exhausted its retries
+            list(executor.map(self._store_embeddings_page, pages))
+        elapsed = time.perf_counter() - start
+
+        logger.info(
+            f"Stored {len(records)} embeddings in {len(pages)} pages "
+            f"({len(records) / elapsed if elapsed else 0:.0f} rows/s)"
+        )
+        return len(records)
+
+    @retry(
+        stop=stop_after_attempt(4),
+        wait=wait_exponential_jitter(initial=0.5, max=8),
+        before_sleep=before_sleep_log(logger, logging.WARNING),
+        reraise=True
+    )
+    def _store_embeddings_page(self, page: list[dict]):
+        self.client.table("document_embeddings").upsert(page, on_conflict="document_id,chunk_index").execute()
+
+    def delete_embeddings_from(self, document_id: str, chunk_index: int):
+        """Removes a document's chunks at or beyond `chunk_index`, left over from a longer earlier run."""
+        res = self.client.table("document_embeddings").delete() \
+            .eq("document_id", document_id).gte("chunk_index", chunk_index).execute()
+        return res.data
+
+    def delete_legacy_embeddings(self, document_id: str):
+        """Removes a document's chunks written before chunk_index existed; a re-run has rewritten them."""
+        res = self.client.table("document_embeddings").delete() \
+            .eq("document_id", document_id).is_("chunk_index", "null").execute()
+        return res.data
+
+    def delete_document_embeddings(self, document_id: str, batch_size: int = 500) -> int:
+        """Deletes all chunks of a document, `batch_size` rows per request. Returns rows removed."""
+        removed = 0
+        while True:
+            res = self.client.table("document_embeddings").select("id") \
+                .eq("document_id", document_id).limit(batch_size).execute()
+            ids = [row["id"] for row in res.data or []]
+            if not ids:
+                return removed
+            self.client.table("document_embeddings").delete().in_("id", ids).execute()
+            removed += len(ids)
+
+    def purge_duplicate_embeddings(self, workspace_id: str = None) -> int:
+        """Deletes duplicate chunks appended by earlier non-idempotent runs. Returns rows removed."""
+        res = self.client.rpc("purge_duplicate_embeddings", {"p_workspace_id": workspace_id}).execute()
+        return res.data or 0
+
+    def get_embeddings_by_hash(self, workspace_id: str, content_hashes: list[str], batch_size: int = 50) -> dict:
+        """
+        Returns {content_hash: embedding} for chunks already stored in the workspace.
+        Hashes are looked up `batch_size` per request to keep the GET URL short; a failed
+        lookup only means those chunks are embedded again.
+        """
+        found = {}
+        for start in range(0, len(content_hashes), batch_size):
+            page = content_hashes[start:start + batch_size]
+            try:
+                res = self.client.table("document_embeddings").select("content_hash, embedding") \
+                    .eq("workspace_id", workspace_id).in_("content_hash", page).execute()
+            except Exception as e:
+                logger.warning(f"Embedding lookup by hash failed, treating {len(page)} chunks as misses: {e}")
+                continue
+
+            for row in res.data or []:
+                embedding = row["embedding"]
+                # pgvector columns come back from PostgREST as a "[...]" string
+                if isinstance(embedding, str):
+                    embedding = json.loads(embedding)
+                found[row["content_hash"]] = embedding
+        return found
+
+    # Extraction cache operations
+    def get_extraction(self, content_hash: str):
+        res = self.client.table("chunk_extractions").select("extraction").eq("content_hash", content_hash).limit(1).execute()
+        return res.data[0]["extraction"] if res.data else None
+
+    def store_extraction(self, content_hash: str, extraction: dict):
+        self.client.table("chunk_extractions").upsert({
+            "content_hash": content_hash, "extraction": extraction
+        }).execute()
 
     def query_embeddings(self, workspace_id: str, query_vector: list, limit: int = 10):
         # Requires match_embeddings RPC in Supabase manually if standard eq doesn't work,
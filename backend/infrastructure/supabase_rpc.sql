@@ -24,4 +24,104 @@ begin
   limit match_count;
 end;
 $$;
+
+-- Page number of the source chunk (NULL for rows written before page tracking)
+alter table document_embeddings add column if not exists page int;
+
+-- Content-addressed deduplication (SHA-256 hex digests)
+alter table documents add column if not exists content_hash text;
+create index if not exists documents_workspace_hash_idx on documents (workspace_id, content_hash);
+
+alter table document_embeddings add column if not exists content_hash text;
+create index if not exists document_embeddings_workspace_hash_idx on document_embeddings (workspace_id, content_hash);
+
+-- Raw LLM extraction results keyed by the hash of the extraction window
+create table if not exists chunk_extractions (
+  content_hash text primary key,
+  extraction jsonb not null,
+  created_at timestamptz default now()
+);
+
+-- Batch uploads: documents created together share a batch id
+alter table documents add column if not exists batch_id uuid;
+create index if not exists documents_batch_idx on documents (batch_id);
+
+-- Atomic workspace counters, used by the ingestion worker instead of read-modify-write
+create or replace function increment_workspace_stats (
+  p_workspace_id uuid,
+  p_user_id uuid,
+  p_doc_delta int DEFAULT 0,
+  p_entity_delta int DEFAULT 0
+) returns void
+language sql
+as $$
+  update workspaces
+  set doc_count = greatest(doc_count + p_doc_delta, 0),
+      entity_count = greatest(entity_count + p_entity_delta, 0),
+      updated_at = now()
+  where id = p_workspace_id and user_id = p_user_id;
+$$;
+
+-- Idempotent chunk writes: each chunk of a document has a stable index
+alter table document_embeddings add column if not exists chunk_index int;
+create unique index if not exists document_embeddings_document_chunk_idx
+  on document_embeddings (document_id, chunk_index);
+
+-- Removes duplicate chunks appended by re-run jobs before chunk_index existed.
+-- Only legacy rows (chunk_index is null) are candidates; indexed rows are unique by
+-- construction. Legacy rows of a document that has since been re-ingested with chunk
+-- indexes are all superseded. Otherwise every run appended each chunk once, so the run
+-- count r is the lowest number of copies of any chunk in the document, and a chunk seen
+-- n times keeps its earliest n / r copies; chunks legitimately repeated inside the
+-- document survive. Pass NULL for all workspaces.
+create or replace function purge_duplicate_embeddings (
+  p_workspace_id uuid DEFAULT NULL
+) returns int
+language plpgsql
+as $$
+declare
+  removed int;
+begin
+  with legacy as (
+    select
+      id,
+      document_id,
+      row_number() over (partition by document_id, md5(content) order by created_at, id) as rn,
+      count(*) over (partition by document_id, md5(content)) as copies
+    from document_embeddings
+    where chunk_index is null
+      and (p_workspace_id is null or workspace_id = p_workspace_id)
+  ),
+  runs as (
+    select document_id, min(copies) as run_count
+    from legacy
+    group by document_id
+  ),
+  reindexed as (
+    select distinct document_id
+    from document_embeddings
+    where chunk_index is not null
+      and (p_workspace_id is null or workspace_id = p_workspace_id)
+  )
+  delete from document_embeddings de
+  using legacy
+  join runs on runs.document_id = legacy.document_id
+  where de.id = legacy.id
+    and (
+      legacy.document_id in (select document_id from reindexed)
+      or legacy.rn > legacy.copies / runs.run_count
+    );
+
+  get diagnostics removed = row_count;
+  return removed;
+end;
+$$;
+
+-- Storage object of each document, so it can be removed or replaced
+alter table documents add column if not exists storage_path text;
+
+-- Documents whose content was already in the workspace when they were processed hold no
+-- chunks or graph data of their own; this points at the document that does
+alter table documents add column if not exists duplicate_of uuid;
+create index if not exists documents_duplicate_of_idx on documents (duplicate_of);
 """
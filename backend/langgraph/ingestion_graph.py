@@ -1,5 +1,6 @@
 from typing import TypedDict, Optional
 from langgraph.graph import StateGraph, END
+from core.config import settings
 from services.document_service import DocumentService
 from services.nlp_service import NLPService
 from services.vector_service import VectorService
@@ -13,46 +14,76 @@ class IngestionState(TypedDict):
     document_id: str
     storage_path: str
     ext: str
-    text: Optional[str]
-    chunks: Optional[list[str]]
+    local_path: Optional[str]
+    duplicate_of: Optional[str]
     extraction: Optional[dict]
+    chunks_stored: Optional[int]
+    entities_created: Optional[int]
 
-def fetch_and_chunk(state: IngestionState):
-    logger.info(f"[{state['document_id']}] Fetching and chunking")
-    text = DocumentService.fetch_and_process_file(state["storage_path"], state["ext"])
-    chunks = DocumentService.chunk_text(text)
-    return {"text": text, "chunks": chunks}
+def fetch_document(state: IngestionState):
+    logger.info(f"[{state['document_id']}] Fetching document")
+    local_path = DocumentService.download_to_local(state["storage_path"], state["document_id"], state["ext"])
+
+    duplicate = DocumentService.find_duplicate(state["workspace_id"], state["document_id"], local_path)
+    if duplicate:
+        logger.info(f"[{state['document_id']}] Identical to already processed document {duplicate['id']}, skipping")
+        return {"local_path": local_path, "duplicate_of": duplicate["id"]}
+
+    return {"local_path": local_path, "duplicate_of": None}
+
+def route_after_fetch(state: IngestionState):
+    # Embedding does not depend on extraction, so both branches start together
+    if state.get("duplicate_of"):
+        return END
+    return ["extract_entities", "embed_and_store"]
 
 def extract_entities(state: IngestionState):
     logger.info(f"[{state['document_id']}] Extracting entities via LLM")
-    extraction = NLPService.extract_entities_and_relationships(state["text"])
-    logger.info(f"Extraction: {extraction}")
+    pieces = DocumentService.stream_text(state["local_path"], state["ext"], settings.EXTRACTION_WINDOW_CHARS)
+    extraction = NLPService.extract_from_chunks(pieces)
+    logger.info(
+        f"[{state['document_id']}] Extracted {len(extraction['entities'])} entities "
+        f"and {len(extraction['relationships'])} relationships"
+    )
     return {"extraction": extraction}
 
 def embed_and_store(state: IngestionState):
     logger.info(f"[{state['document_id']}] Embedding and storing vectors")
-    VectorService.embed_and_store_chunks(state["document_id"], state["workspace_id"], state["chunks"])
-    return {}
+    chunks = DocumentService.stream_chunks(state["local_path"], state["ext"])
+    stored = VectorService.embed_and_store_chunks(state["document_id"], state["workspace_id"], chunks)
+    logger.info(f"[{state['document_id']}] Stored {stored} chunks")
+    return {"chunks_stored": stored}
 
 def store_graph(state: IngestionState):
     logger.info(f"[{state['document_id']}] Storing graph in Neo4j")
-    GraphService.create_subgraph(
+    entities_created = GraphService.create_subgraph(
         state["workspace_id"], 
         state["extraction"]["entities"], 
-        state["extraction"]["relationships"]
+        state["extraction"]["relationships"],
+        state["document_id"]
+    )
+    return {"entities_created": entities_created}
+
+def join_branches(state: IngestionState):
+    logger.info(
+        f"[{state['document_id']}] Ingestion branches joined: "
+        f"{state.get('chunks_stored', 0)} chunks, {len(state['extraction']['entities'])} entities"
     )
     return {}
 
 builder = StateGraph(IngestionState)
-builder.add_node("fetch_and_chunk", fetch_and_chunk)
+builder.add_node("fetch_document", fetch_document)
 builder.add_node("extract_entities", extract_entities)
 builder.add_node("embed_and_store", embed_and_store)
 builder.add_node("store_graph", store_graph)
+builder.add_node("join_branches", join_branches)
+
+builder.set_entry_point("fetch_document")
+builder.add_conditional_edges("fetch_document", route_after_fetch, ["extract_entities", "embed_and_store", END])
 
-builder.set_entry_point("fetch_and_chunk")
-builder.add_edge("fetch_and_chunk", "extract_entities")
-builder.add_edge("extract_entities", "embed_and_store")
-builder.add_edge("embed_and_store", "store_graph")
-builder.add_edge("store_graph", END)
+# Branch 1: LLM extraction -> graph write. Branch 2: embedding -> vector store.
+builder.add_edge("extract_entities", "store_graph")
+builder.add_edge(["embed_and_store", "store_graph"], "join_branches")
+builder.add_edge("join_branches", END)
 
 ingestion_pipeline = builder.compile()
@@ -1,12 +1,17 @@
-from typing import TypedDict, Optional, Any
-from langgraph.graph import StateGraph, END
-from services.nlp_service import NLPService
+from typing import TypedDict, Optional, Any, Annotated
+from langgraph.graph import StateGraph, START, END
+from services.nlp_service import NLPService, GenerationError, GENERATION_FAILED
 from services.vector_service import VectorService
 from services.graph_service import GraphService
+from services.entity_matcher import entity_matcher
+import asyncio
 import json
 import logging
+import operator
+from core.compute import compute_pool, ComputeOverloaded
 from services.ranking_service import ranking_service
 from infrastructure.llm_provider import llm_provider
+from core.config import settings
 from utils.text_normalizer import normalize_entity
 
 logging.basicConfig(level=logging.INFO)
@@ -21,10 +26,34 @@ class QueryState(TypedDict):
     merged_context: Optional[str]
     sources: Optional[list[dict]]
     answer: Optional[str]
+    # Names of the nodes that failed; both branches may append, hence the reducer
+    errors: Annotated[list[str], operator.add]
 
-def extract_query_entities(state: QueryState):
+async def extract_query_entities(state: QueryState):
     logger.info(f"Extracting entities for query: {state['query']}")
 
+    # Known entity names are matched locally; the LLM is only a fallback
+    if entity_matcher:
+        try:
+            entities = await asyncio.to_thread(entity_matcher.match, state["workspace_id"], state["query"])
+        except Exception as e:
+            logger.warning(f"Entity matcher failed: {e}")
+            entities = []
+
+        if entities or not settings.ENTITY_MATCHER_LLM_FALLBACK:
+            logger.info(f"Matched query entities: {entities}")
+            return {"extracted_entities": entities}
+
+    try:
+        entities = await extract_query_entities_llm(state["query"])
+    except Exception as e:
+        logger.warning(f"Failed to extract entities from query: {e}")
+        return {"extracted_entities": [], "errors": ["extract_query_entities"]}
+
+    logger.info(f"Normalized Query entities: {entities}")
+    return {"extracted_entities": entities}
+
+async def extract_query_entities_llm(query: str) -> list[str]:
     prompt = f"""
 Extract key entity names from this query.
 
@@ -36,45 +65,47 @@ Rules:
 - Avoid plurals
 
 Query:
-{state['query']}
+{query}
 """
-    try:
-        raw_res = llm_provider.generate_json(
-            prompt,
-            system_prompt="You extract normalized entity names."
-        )
-
-        data = json.loads(raw_res)
-        entities = data.get("entities", [])
-
-        if not isinstance(entities, list):
-            entities = []
+    raw_res = await llm_provider.agenerate_json(
+        prompt,
+        system_prompt="You extract normalized entity names.",
+        cache_site="query_entities"
+    )
 
-        entities = list(set([
-            normalize_entity(e) for e in entities if isinstance(e, str)
-        ]))
+    data = json.loads(raw_res)
+    entities = data.get("entities", [])
 
-    except Exception as e:
-        logger.warning(f"Failed to extract entities from query: {e}")
+    if not isinstance(entities, list):
         entities = []
 
-    logger.info(f"Normalized Query entities: {entities}")
-    return {"extracted_entities": entities}
+    entities = list(set([
+        normalize_entity(e) for e in entities if isinstance(e, str)
+    ]))
+
+    return entities
 
-def retrieve_vectors(state: QueryState):
+async def retrieve_vectors(state: QueryState):
     logger.info("Retrieving vectors")
-    chunks = VectorService.retrieve_similar_chunks(state["workspace_id"], state["query"])
+    try:
+        chunks = await VectorService.aretrieve_similar_chunks(state["workspace_id"], state["query"])
+    except ComputeOverloaded:
+        raise
+    except Exception:
+        return {"vector_context": [], "errors": ["retrieve_vectors"]}
     chunks = list(set(chunks)) if chunks else []
     return {"vector_context": chunks}
 
-def rank_chunks(state: QueryState):
+async def rank_chunks(state: QueryState):
     logger.info("Ranking chunks using CrossEncoder")
 
     chunks = state.get("vector_context", [])
     if not chunks:
         return {"vector_context": []}
 
-    ranked_chunks = ranking_service.rank(
+    # CrossEncoder inference is CPU-bound: run it on the bounded compute pool
+    ranked_chunks = await compute_pool.run(
+        ranking_service.rank,
         query=state["query"],
         chunks=chunks,
         top_k=3
@@ -82,7 +113,7 @@ def rank_chunks(state: QueryState):
 
     return {"vector_context": ranked_chunks}
 
-def summarize_chunks(state: QueryState):
+async def summarize_chunks(state: QueryState):
     logger.info("Summarizing ranked chunks")
 
     chunks = state.get("vector_context", [])
@@ -109,21 +140,28 @@ def summarize_chunks(state: QueryState):
         - No explanations, only useful facts
     """
 
-    summary = NLPService.generate_response(prompt)
+    try:
+        summary = await NLPService.agenerate_response(prompt, cache_site="summarize", raise_on_error=True)
+    except GenerationError:
+        # Answer from the ranked chunks themselves rather than from an error message
+        return {"vector_context": chunks, "errors": ["summarize_chunks"]}
 
     return {"vector_context": [summary]}
 
-def retrieve_graph(state: QueryState):
+async def retrieve_graph(state: QueryState):
     logger.info("Retrieving graph context")
     if not state.get("extracted_entities"):
         return {"graph_context": []}
-    context = GraphService.retrieve_context(state["workspace_id"], state["extracted_entities"])
+    try:
+        context = await asyncio.to_thread(GraphService.retrieve_context, state["workspace_id"], state["extracted_entities"])
+    except Exception:
+        return {"graph_context": [], "errors": ["retrieve_graph"]}
     logger.info(f"Retrieved graph context: {context}")
     return {"graph_context": context}
 
 
-def merge_and_answer(state: QueryState):
-    logger.info("Merging context and generating answer")
+def assemble_context(state: QueryState) -> tuple[str, list[dict]]:
+    """Builds the merged LLM context and the sources list from both retrieval branches."""
     vc = "\n".join(state["vector_context"]) if state.get("vector_context") else "None"
     gc = json.dumps(state["graph_context"]) if state.get("graph_context") else "None"
     logger.info(f"Vector context: {vc}")
@@ -131,10 +169,7 @@ def merge_and_answer(state: QueryState):
     logger.info(f"Query: {state['query']}")
     
     merged = f"--- Vector Matches ---\n{vc}\n\n--- Graph Relationships ---\n{gc}"
-    
-    ans = NLPService.generate_rag_response(state["query"], merged)
-    
-    logger.info(f"Answer: {ans}")
+
     # Construct sources list
     sources = []
     if state.get("vector_context"):
@@ -143,25 +178,57 @@ def merge_and_answer(state: QueryState):
     if state.get("graph_context"):
         for gc_item in state["graph_context"]:
             sources.append({"content": json.dumps(gc_item), "document_name": "Knowledge Graph Relationship"})
+
+    return merged, sources
+
+def is_cacheable(state: QueryState) -> bool:
+    """An answer may be cached only if no node failed and retrieval found some context."""
+    return not state.get("errors") and bool(state.get("vector_context") or state.get("graph_context"))
+
+async def merge_and_answer(state: QueryState):
+    logger.info("Merging context and generating answer")
+    merged, sources = assemble_context(state)
     
+    try:
+        ans = await NLPService.agenerate_rag_response(state["query"], merged)
+    except GenerationError:
+        return {"merged_context": merged, "answer": GENERATION_FAILED, "sources": sources, "errors": ["merge_and_answer"]}
+    
+    logger.info(f"Answer: {ans}")
     return {"merged_context": merged, "answer": ans, "sources": sources}
 
-builder = StateGraph(QueryState)
+def build_query_graph(with_answer: bool = True):
+    """
+    Two independent branches run concurrently and join before the answer:
+      graph:  extract_query_entities -> retrieve_graph
+      vector: retrieve_vectors -> rank_chunks -> summarize_chunks
+    Without `with_answer` the graph stops after retrieval, for callers that stream the answer themselves.
+    """
+    builder = StateGraph(QueryState)
+
+    builder.add_node("extract_query_entities", extract_query_entities)
+    builder.add_node("retrieve_vectors", retrieve_vectors)
+    builder.add_node("rank_chunks", rank_chunks)
+    builder.add_node("summarize_chunks", summarize_chunks)
+    builder.add_node("retrieve_graph", retrieve_graph)
+
+    builder.add_edge(START, "extract_query_entities")
+    builder.add_edge(START, "retrieve_vectors")
+
+    builder.add_edge("extract_query_entities", "retrieve_graph")
 
-builder.add_node("extract_query_entities", extract_query_entities)
-builder.add_node("retrieve_vectors", retrieve_vectors)
-builder.add_node("rank_chunks", rank_chunks)            
-builder.add_node("summarize_chunks", summarize_chunks)  
-builder.add_node("retrieve_graph", retrieve_graph)
-builder.add_node("merge_and_answer", merge_and_answer)
+    builder.add_edge("retrieve_vectors", "rank_chunks")
+    builder.add_edge("rank_chunks", "summarize_chunks")
 
-builder.set_entry_point("extract_query_entities")
+    if with_answer:
+        builder.add_node("merge_and_answer", merge_and_answer)
+        builder.add_edge(["summarize_chunks", "retrieve_graph"], "merge_and_answer")
+        builder.add_edge("merge_and_answer", END)
+    else:
+        builder.add_edge("summarize_chunks", END)
+        builder.add_edge("retrieve_graph", END)
 
-builder.add_edge("extract_query_entities", "retrieve_vectors")
-builder.add_edge("retrieve_vectors", "rank_chunks")      
-builder.add_edge("rank_chunks", "summarize_chunks")         
-builder.add_edge("summarize_chunks", "retrieve_graph")      
-builder.add_edge("retrieve_graph", "merge_and_answer")
-builder.add_edge("merge_and_answer", END)
+    return builder.compile()
 
-query_pipeline = builder.compile()
\ No newline at end of file
+query_pipeline = build_query_graph()
+retrieval_pipeline = build_query_graph(with_answer=False)
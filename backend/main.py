@@ -1,11 +1,16 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
 from core.config import settings
+from core.upload_limit import UploadSizeLimitMiddleware
+from core.security import jwks_cache, get_current_user
 from infrastructure.neo4j_adapter import neo4j_adapter
+from infrastructure.llm_provider import llm_provider
+from infrastructure.embedding_provider import embedding_provider
 
 from api.workspaces import router as workspace_router
 from api.graph import router as graph_router
@@ -22,13 +27,28 @@ async def lifespan(app: FastAPI):
          neo4j_adapter.init_db()
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
+
+    # Load the JWT signing keys, then keep them fresh in the background
+    await jwks_cache.refresh(force=True)
+    rotation = asyncio.create_task(jwks_cache.run_rotation(settings.JWKS_REFRESH_INTERVAL))
     yield
+    rotation.cancel()
     # Shutdown: Close Neo4j driver
     logger.info("Shutting down: Closing database connection...")
     neo4j_adapter.close()
 
 app = FastAPI(title="Knowledge Graph Builder API (Modular)", lifespan=lifespan)
 
+# Refuse oversized uploads before the multipart body is buffered
+# (allow some headroom for the multipart envelope around the file).
+# Added before CORS, which must stay outermost so the 413 still carries CORS headers.
+app.add_middleware(UploadSizeLimitMiddleware, max_bytes=settings.MAX_UPLOAD_BYTES + 64 * 1024)
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_bytes=(settings.MAX_UPLOAD_BYTES + 64 * 1024) * settings.MAX_BATCH_FILES,
+    path_suffixes=("/upload/batch",)
+)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -40,6 +60,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 app.include_router(workspace_router)
@@ -51,5 +72,14 @@ app.include_router(query_router)
 async def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics/cache")
+async def cache_metrics(user: dict = Depends(get_current_user)):
+    """LLM cache hit rates across all API and worker processes; embedding cache figures are this process's."""
+    return {
+        # Counters live in the cache backend, so reading them is I/O
+        "llm": await asyncio.to_thread(llm_provider.cache.stats) if llm_provider.cache else None,
+        "embeddings": embedding_provider.cache.stats() if embedding_provider.cache else None
+    }
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=settings.PORT)
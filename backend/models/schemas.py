@@ -22,6 +22,7 @@ class DocumentResponse(BaseModel):
     status: Optional[str] = "pending"
     job_id: Optional[str] = None
     error: Optional[str] = None
+    duplicate_of: Optional[str] = None
 
 class JobResponse(BaseModel):
     job_id: str
@@ -29,6 +30,28 @@ class JobResponse(BaseModel):
     document_id: str
     error: Optional[str] = None
 
+class BatchUploadResponse(BaseModel):
+    batch_id: str
+    status: str
+    document_ids: List[str]
+    job_ids: List[str]
+    duplicate_document_ids: List[str] = []
+
+class BatchDocumentStatus(BaseModel):
+    document_id: str
+    file_name: str
+    status: str
+    job_id: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchStatusResponse(BaseModel):
+    batch_id: str
+    status: str
+    total: int
+    counts: dict
+    progress: float
+    documents: List[BatchDocumentStatus]
+
 class GraphNode(BaseModel):
     id: str
     label: str
@@ -44,6 +67,14 @@ class GraphResponse(BaseModel):
     nodes: List[GraphNode]
     edges: List[GraphEdge]
 
+class GraphNodePage(BaseModel):
+    items: List[GraphNode]
+    next_cursor: Optional[str] = None
+
+class GraphEdgePage(BaseModel):
+    items: List[GraphEdge]
+    next_cursor: Optional[str] = None
+
 class QueryRequest(BaseModel):
     workspace_id: str
     query: str
@@ -55,3 +86,4 @@ class Source(BaseModel):
 class QueryResponse(BaseModel):
     answer: str
     sources: List[Source]
+    cached: bool = False
@@ -13,9 +13,5 @@ else
     exit 1
 fi
 
-# Start the worker
-rq worker \
-  --url "$REDIS_URL" \
-  --with-scheduler \
-  --name "kgbuilder-worker-2" \
-  -v
\ No newline at end of file
+# Start the worker (models are preloaded once; set WORKER_MODE=plain|preload|pool)
+python -m workers.main --mode "${WORKER_MODE:-preload}"
\ No newline at end of file
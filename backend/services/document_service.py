@@ -2,63 +2,124 @@ import fitz
 import os
 import tempfile
 import logging
+from typing import Iterable, Iterator
 from infrastructure.supabase_adapter import supabase_adapter
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from utils.hashing import sha256_text, sha256_file
 
 logger = logging.getLogger(__name__)
 
+# Size of the blocks read from plain-text files when streaming
+TXT_BLOCK_CHARS = 64 * 1024
+
 class DocumentService:
     @staticmethod
-    def extract_text_from_pdf(file_path: str) -> str:
-        text = ""
+    def iter_pdf_pages(file_path: str) -> Iterator[tuple[int, str]]:
+        """Yields (page_number, text) one page at a time, 1-indexed."""
         try:
             doc = fitz.open(file_path)
+        except Exception as e:
+            logger.error(f"Error opening PDF: {e}")
+            raise e
+
+        try:
             for page in doc:
-                text += page.get_text()
-            doc.close()
+                yield page.number + 1, page.get_text()
         except Exception as e:
             logger.error(f"Error extracting text from PDF: {e}")
             raise e
-        return text
+        finally:
+            doc.close()
 
     @staticmethod
-    def extract_text_from_txt(file_path: str) -> str:
+    def iter_txt_pages(file_path: str) -> Iterator[tuple[int, str]]:
+        """Yields a TXT file in line-aligned blocks. Plain text has no pages, so every block is page 1."""
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
+                carry = ""
+                while True:
+                    block = f.read(TXT_BLOCK_CHARS)
+                    if not block:
+                        break
+                    block = carry + block
+                    cut = block.rfind("\n")
+                    if cut == -1:
+                        carry = block
+                        continue
+                    carry = block[cut + 1:]
+                    yield 1, block[:cut + 1]
+                if carry:
+                    yield 1, carry
         except Exception as e:
             logger.error(f"Error reading TXT file: {e}")
             raise e
 
     @classmethod
-    def fetch_and_process_file(cls, storage_path: str, ext: str) -> str:
-        """Fetches a file from Supabase storage and extracts its text."""
-        # Create a temp file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp:
-            local_path = tmp.name
-            
-        try:
-            # Download from storage
-            supabase_adapter.download_file(storage_path, local_path)
-            
-            # Extract
-            if ext.lower() == '.pdf':
-                return cls.extract_text_from_pdf(local_path)
-            elif ext.lower() == '.txt':
-                return cls.extract_text_from_txt(local_path)
-            else:
-                raise ValueError(f"Unsupported file format: {ext}")
-        finally:
-            if os.path.exists(local_path):
-                os.remove(local_path)
+    def iter_pages(cls, file_path: str, ext: str) -> Iterator[tuple[int, str]]:
+        if ext.lower() == '.pdf':
+            return cls.iter_pdf_pages(file_path)
+        elif ext.lower() == '.txt':
+            return cls.iter_txt_pages(file_path)
+        else:
+            raise ValueError(f"Unsupported file format: {ext}")
+
+    @staticmethod
+    def local_path_for(document_id: str, ext: str) -> str:
+        """Stable per-document temp path, so the file can be cleaned up even if the pipeline fails."""
+        return os.path.join(tempfile.gettempdir(), f"kg-{document_id}{ext}")
+
+    @classmethod
+    def download_to_local(cls, storage_path: str, document_id: str, ext: str) -> str:
+        """Downloads a file from Supabase storage to its local temp path."""
+        if ext.lower() not in ('.pdf', '.txt'):
+            raise ValueError(f"Unsupported file format: {ext}")
+        local_path = cls.local_path_for(document_id, ext)
+        supabase_adapter.download_file(storage_path, local_path)
+        return local_path
+
+    @classmethod
+    def remove_local_file(cls, document_id: str, ext: str):
+        local_path = cls.local_path_for(document_id, ext)
+        if os.path.exists(local_path):
+            os.remove(local_path)
+
+    @staticmethod
+    def find_duplicate(workspace_id: str, document_id: str, local_path: str):
+        """Records the document's content hash and returns an already-processed copy in the workspace, if any."""
+        content_hash = sha256_file(local_path)
+        supabase_adapter.set_document_hash(document_id, content_hash)
+        return supabase_adapter.find_document_by_hash(workspace_id, content_hash, exclude_id=document_id)
 
     @staticmethod
-    def chunk_text(text: str, chunk_size: int = 100, overlap: int = 20) -> list[str]:
+    def chunk_pages(pages: Iterable[tuple[int, str]], chunk_size: int = 100, overlap: int = 20) -> Iterator[dict]:
         """
-        Splits text into chunks of roughly `chunk_size` words with `overlap` words.
-        Since standard tokens usually map to ~0.75 words, 600 words is approx 800 tokens.
+        Splits text into chunks of roughly `chunk_size` characters overlapping by `overlap`.
+        Consumes (page_number, text) pairs and yields
+        {"content", "page", "chunk_index", "content_hash"} dicts, so only one page is held in memory at a time.
         """
         splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=overlap)
-        chunks = splitter.split_text(text)
+        chunk_index = 0
 
-        return chunks
+        for page_number, page_text in pages:
+            for chunk in splitter.split_text(page_text):
+                yield {
+                    "content": chunk,
+                    "page": page_number,
+                    "chunk_index": chunk_index,
+                    "content_hash": sha256_text(chunk)
+                }
+                chunk_index += 1
+
+    @classmethod
+    def stream_chunks(cls, local_path: str, ext: str, chunk_size: int = 100, overlap: int = 20) -> Iterator[dict]:
+        return cls.chunk_pages(cls.iter_pages(local_path, ext), chunk_size, overlap)
+
+    @classmethod
+    def stream_text(cls, local_path: str, ext: str, max_chars: int) -> Iterator[str]:
+        """
+        Page text in pieces of at most `max_chars` characters, split without overlap. Extraction
+        reads this rather than the small overlapping embedding chunks, so no text is sent twice.
+        """
+        splitter = RecursiveCharacterTextSplitter(chunk_size=max_chars, chunk_overlap=0)
+        for _, page_text in cls.iter_pages(local_path, ext):
+            yield from splitter.split_text(page_text)
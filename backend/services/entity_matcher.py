@@ -0,0 +1,142 @@
+import json
+import logging
+import re
+import threading
+import time
+from cachetools import LRUCache
+from core.config import settings
+from infrastructure.neo4j_adapter import neo4j_adapter
+from utils.aho_corasick import AhoCorasick
+from utils.text_normalizer import normalize_entity, normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+class _WorkspaceMatcher:
+    def __init__(self, last_event_id: str):
+        self.automaton = AhoCorasick()
+        self.last_event_id = last_event_id
+        self.loaded_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def add(self, name: str, min_length: int):
+        # Index the stored form and the word-by-word lemmatized form, so that a query
+        # mentioning "neural networks" still finds the entity "neural network"
+        for form in {normalize_entity(name), normalize_text(name)}:
+            if len(form) >= min_length:
+                self.automaton.add(f" {form} ", name)
+
+
+class EntityMatcher:
+    """
+    Finds known entity names in a query without an LLM call.
+    Each workspace gets an Aho-Corasick automaton over its entity names, built lazily from
+    Neo4j on first use and kept in a bounded LRU. Writers append events to a Redis stream
+    per workspace: ingestion publishes the names it added, which are inserted into the live
+    automaton; edits, merges and removals publish a reset, which rebuilds it from Neo4j.
+    Without Redis an automaton is simply rebuilt once it is older than ENTITY_MATCHER_TTL.
+    """
+
+    def __init__(self, redis_conn, max_workspaces: int, ttl: int, min_name_length: int):
+        self.redis = redis_conn
+        self.ttl = ttl
+        self.min_name_length = min_name_length
+        self.workspaces = LRUCache(maxsize=max_workspaces)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _stream_key(workspace_id: str) -> str:
+        return f"entities:events:{workspace_id}"
+
+    def _publish(self, workspace_id: str, event: dict):
+        if not self.redis:
+            return
+        try:
+            self.redis.xadd(self._stream_key(workspace_id), {"event": json.dumps(event)}, maxlen=1000, approximate=True)
+        except Exception as e:
+            logger.warning(f"Failed to publish entity event for {workspace_id}: {e}")
+
+    def publish_added(self, workspace_id: str, names: list[str]):
+        if names:
+            self._publish(workspace_id, {"op": "add", "names": names})
+
+    def publish_reset(self, workspace_id: str):
+        # Drop this process's copy right away; other processes see the event
+        with self.lock:
+            self.workspaces.pop(workspace_id, None)
+        self._publish(workspace_id, {"op": "reset"})
+
+    def _latest_event_id(self, workspace_id: str) -> str:
+        if not self.redis:
+            return "0-0"
+        try:
+            latest = self.redis.xrevrange(self._stream_key(workspace_id), count=1)
+        except Exception as e:
+            logger.warning(f"Failed to read entity events for {workspace_id}: {e}")
+            return "0-0"
+        return latest[0][0].decode() if latest else "0-0"
+
+    def _load(self, workspace_id: str) -> _WorkspaceMatcher:
+        # Read the stream position first so events racing with the load are replayed, not lost
+        start = time.perf_counter()
+        matcher = _WorkspaceMatcher(self._latest_event_id(workspace_id))
+        names = neo4j_adapter.get_entity_names(workspace_id)
+        for name in names:
+            matcher.add(name, self.min_name_length)
+        logger.info(f"Built entity matcher for {workspace_id}: {len(names)} names in {time.perf_counter() - start:.2f}s")
+        return matcher
+
+    def _pending_events(self, workspace_id: str, matcher: _WorkspaceMatcher) -> list:
+        if not self.redis:
+            return []
+        try:
+            entries = self.redis.xrange(self._stream_key(workspace_id), min=f"({matcher.last_event_id}")
+        except Exception as e:
+            logger.warning(f"Failed to read entity events for {workspace_id}: {e}")
+            return []
+        return [(entry_id.decode(), json.loads(fields[b"event"])) for entry_id, fields in entries]
+
+    def _get(self, workspace_id: str) -> _WorkspaceMatcher:
+        with self.lock:
+            matcher = self.workspaces.get(workspace_id)
+
+        if matcher is None or time.monotonic() - matcher.loaded_at > self.ttl:
+            matcher = self._load(workspace_id)
+        else:
+            events = self._pending_events(workspace_id, matcher)
+            if any(event["op"] == "reset" for _, event in events):
+                matcher = self._load(workspace_id)
+            elif events:
+                with matcher.lock:
+                    for event_id, event in events:
+                        for name in event["names"]:
+                            matcher.add(name, self.min_name_length)
+                        matcher.last_event_id = event_id
+
+        with self.lock:
+            self.workspaces[workspace_id] = matcher
+        return matcher
+
+    def match(self, workspace_id: str, query: str) -> list[str]:
+        """Returns the workspace's entity names mentioned in `query`."""
+        matcher = self._get(workspace_id)
+        # Stored names drop punctuation ("gpt-4" -> "gpt4"), so also scan the query that way
+        texts = {normalize_text(query), normalize_text(re.sub(r"[^\w\s]", "", query))}
+        with matcher.lock:
+            return sorted({name for text in texts for _, _, name in matcher.automaton.iter(f" {text} ")})
+
+
+def build_entity_matcher():
+    if not settings.ENTITY_MATCHER_ENABLED:
+        return None
+
+    from infrastructure.redis_adapter import redis_adapter
+    return EntityMatcher(
+        redis_adapter.redis_conn,
+        max_workspaces=settings.ENTITY_MATCHER_MAX_WORKSPACES,
+        ttl=settings.ENTITY_MATCHER_TTL,
+        min_name_length=settings.ENTITY_MATCHER_MIN_NAME_LENGTH
+    )
+
+
+entity_matcher = build_entity_matcher()
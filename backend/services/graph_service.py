@@ -1,35 +1,105 @@
+import gzip
+import json
 from infrastructure.neo4j_adapter import neo4j_adapter
+from infrastructure.graph_snapshot_cache import graph_snapshots
+from core.config import settings
+from utils.pagination import encode_cursor, decode_cursor
+from services.entity_matcher import entity_matcher
 import logging
 
 logger = logging.getLogger(__name__)
 
 class GraphService:
     @staticmethod
-    def create_subgraph(workspace_id: str, entities: list, relationships: list):
-        """Creates or merges subgraph in Neo4j."""
+    def create_subgraph(workspace_id: str, entities: list, relationships: list, document_id: str = None) -> int:
+        """Creates or merges subgraph in Neo4j. Returns the number of entities that did not exist before."""
         try:
-            neo4j_adapter.create_graph(workspace_id, entities, relationships)
+            created = neo4j_adapter.create_graph(workspace_id, entities, relationships, document_id)
         except Exception as e:
             logger.error(f"Failed to create subgraph: {e}")
             raise e
 
+        if entity_matcher:
+            entity_matcher.publish_added(workspace_id, [e["name"] for e in entities if e.get("name")])
+        return created
+
+    @staticmethod
+    def remove_document(workspace_id: str, document_id: str) -> dict:
+        """Removes the nodes and relationships only this document contributed."""
+        removed = neo4j_adapter.remove_document(workspace_id, document_id)
+        if entity_matcher and removed.get("nodes_deleted"):
+            entity_matcher.publish_reset(workspace_id)
+        return removed
+
+    @staticmethod
+    def count_entities(workspace_id: str) -> int:
+        return neo4j_adapter.count_entities(workspace_id)
+
     @staticmethod
     def get_workspace_graph(workspace_id: str):
         return neo4j_adapter.get_workspace_graph(workspace_id)
 
+    @staticmethod
+    def graph_version(workspace_id: str):
+        """Current graph version of the workspace, or None when snapshots are disabled."""
+        return graph_snapshots.version(workspace_id) if graph_snapshots else None
+
+    @staticmethod
+    def get_graph_snapshot(workspace_id: str, version: int) -> bytes:
+        """The gzip-compressed JSON graph for `version`, built from Neo4j only on a cache miss."""
+        snapshot = graph_snapshots.get(workspace_id, version)
+        if snapshot is None:
+            graph = neo4j_adapter.get_workspace_graph(workspace_id)
+            snapshot = gzip.compress(json.dumps(graph).encode("utf-8"), compresslevel=6)
+            graph_snapshots.set(workspace_id, version, snapshot)
+            logger.info(f"Cached graph snapshot for {workspace_id} v{version}: {len(snapshot)} bytes")
+        return snapshot
+
+    @staticmethod
+    def get_nodes_page(workspace_id: str, cursor: str = None, limit: int = 1000) -> dict:
+        """One keyset page of nodes. Raises ValueError on a malformed cursor."""
+        after = decode_cursor(cursor) if cursor else None
+        if after is not None and not isinstance(after, str):
+            raise ValueError("Invalid cursor")
+        nodes = neo4j_adapter.get_nodes_page(workspace_id, after, limit)
+        next_cursor = encode_cursor(nodes[-1]["id"]) if len(nodes) == limit else None
+        return {"items": nodes, "next_cursor": next_cursor}
+
+    @staticmethod
+    def get_edges_page(workspace_id: str, cursor: str = None, limit: int = 1000) -> dict:
+        """One keyset page of edges. Raises ValueError on a malformed cursor."""
+        after = decode_cursor(cursor) if cursor else None
+        if after is not None and not (isinstance(after, list) and len(after) == 2):
+            raise ValueError("Invalid cursor")
+        edges = neo4j_adapter.get_edges_page(workspace_id, tuple(after) if after else None, limit)
+        next_cursor = encode_cursor(list(edges[-1]["key"])) if len(edges) == limit else None
+        for edge in edges:
+            edge.pop("key")
+        return {"items": edges, "next_cursor": next_cursor}
+
+    @staticmethod
+    def export_graph_ndjson(workspace_id: str):
+        """Yields the workspace graph as NDJSON lines: every node, then every edge."""
+        for kind, item in neo4j_adapter.iter_workspace_graph(workspace_id, settings.GRAPH_PAGE_SIZE):
+            yield json.dumps({"type": kind, **item}) + "\n"
+
     @staticmethod
     def retrieve_context(workspace_id: str, entities: list[str]) -> list[dict]:
-        """Retrieves connections for particular entities to provide structured RAG context."""
+        """Retrieves connections for particular entities to provide structured RAG context. Errors propagate."""
         try:
             return neo4j_adapter.retrieve_context(workspace_id, entities, limit=20)
         except Exception as e:
             logger.error(f"Failed to retrieve graph context: {e}")
-            return []
+            raise
 
     @staticmethod
     def merge_entities(workspace_id: str, keep_name: str, delete_name: str):
         neo4j_adapter.merge_entities(workspace_id, keep_name, delete_name)
+        if entity_matcher:
+            entity_matcher.publish_reset(workspace_id)
 
     @staticmethod
     def edit_entity(workspace_id: str, old_name: str, new_name: str, new_type: str, new_desc: str):
         neo4j_adapter.edit_entity(workspace_id, old_name, new_name, new_type, new_desc)
+        if entity_matcher and old_name != new_name:
+            entity_matcher.publish_reset(workspace_id)
@@ -1,41 +1,122 @@
 import json
 import logging
-from infrastructure.llm_provider import llm_provider
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Iterable, Iterator
+from core.config import settings
+from infrastructure.llm_provider import llm_provider, RETRYABLE_ERRORS
+from infrastructure.rate_limiter import PRIORITY_BACKGROUND
+from infrastructure.supabase_adapter import supabase_adapter
+from utils.hashing import sha256_text
 from utils.text_normalizer import normalize_entity
 
 logger = logging.getLogger(__name__)
 
+GENERATION_FAILED = "Failed to generate response."
+
+
+class GenerationError(Exception):
+    """Raised by the async generation helpers when `raise_on_error` is set."""
+
 
 class NLPService:
 
     @staticmethod
-    def generate_response(
+    async def agenerate_response(
         prompt: str,
         system_prompt: str = "You are a helpful AI assistant.",
         model: str = "llama-3.1-8b-instant",
-        max_chars: int = 12000
+        max_chars: int = 12000,
+        cache_site: str = None,
+        raise_on_error: bool = False
     ) -> str:
         """
-        Generic wrapper for LLM calls.
-        Handles truncation and error safety.
+        Generic LLM call for the query path, with prompt truncation. With `raise_on_error` a
+        failed call raises GenerationError instead of returning the failure message.
         """
 
         try:
-            # Prevent context overflow
-            safe_prompt = prompt[:max_chars]
-
-            return llm_provider.generate_text(
-                prompt=safe_prompt,
+            return await llm_provider.agenerate_text(
+                prompt=prompt[:max_chars],
                 system_prompt=system_prompt,
-                model=model
+                model=model,
+                cache_site=cache_site
             )
 
         except Exception as e:
             logger.error(f"LLM generation failed: {e}")
-            return "Failed to generate response."
+            if raise_on_error:
+                raise GenerationError(str(e)) from e
+            return GENERATION_FAILED
+
+    @staticmethod
+    def extract_from_chunks(chunks: Iterable[str], window_chars: int = None, max_workers: int = None) -> dict:
+        """
+        Map-reduce extraction over the whole document.
+        Consecutive chunks are packed into windows, each window is sent to the LLM
+        with bounded concurrency, and the partial results are merged and deduplicated.
+        `chunks` may be a lazy stream; at most `max_workers` windows are in flight at once.
+        """
+        window_chars = window_chars or settings.EXTRACTION_WINDOW_CHARS
+        max_workers = max_workers or settings.EXTRACTION_CONCURRENCY
+
+        partials = []
+        window_count = 0
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            in_flight = set()
+            for window in NLPService.build_windows(chunks, window_chars):
+                if len(in_flight) >= max_workers:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    partials.extend(f.result() for f in done)
+                in_flight.add(executor.submit(NLPService._extract_window, window))
+                window_count += 1
+
+            partials.extend(f.result() for f in in_flight)
+
+        logger.info(f"Extracted over {window_count} windows with concurrency {max_workers}")
+        return NLPService._merge(partials)
 
     @staticmethod
-    def extract_entities_and_relationships(text: str) -> dict:
+    def build_windows(chunks: Iterable[str], window_chars: int) -> Iterator[str]:
+        """Packs consecutive chunks into windows of at most `window_chars` characters."""
+        current = []
+        current_len = 0
+
+        for chunk in chunks:
+            if current and current_len + len(chunk) > window_chars:
+                yield "\n".join(current)
+                current, current_len = [], 0
+            current.append(chunk)
+            current_len += len(chunk) + 1
+
+        if current:
+            yield "\n".join(current)
+
+    @staticmethod
+    def _extract_window(text: str) -> dict:
+        """Extracts one window, reusing the stored result when identical text was extracted before."""
+        content_hash = sha256_text(text)
+
+        try:
+            cached = supabase_adapter.get_extraction(content_hash)
+            if cached is not None:
+                return cached
+        except Exception as e:
+            logger.warning(f"Extraction cache lookup failed: {e}")
+
+        data = NLPService._extract_raw(text)
+
+        if data:
+            try:
+                supabase_adapter.store_extraction(content_hash, data)
+            except Exception as e:
+                logger.warning(f"Failed to store extraction result: {e}")
+
+        return data
+
+    @staticmethod
+    def _extract_raw(text: str) -> dict:
+        """Runs the extraction prompt on one window and returns the unvalidated JSON."""
         prompt = f"""
         Extract entities and relationships from the following text based on the provided schema.
         Return the output strictly in JSON format.
@@ -51,7 +132,7 @@ class NLPService:
         }}
 
         Text:
-        {text[:4000]}
+        {text}
         
         JSON Output:
         """
@@ -59,15 +140,35 @@ class NLPService:
         try:
             raw_result = llm_provider.generate_json(
                 prompt=prompt,
-                system_prompt="You extract structured knowledge graphs. Output ONLY valid JSON."
+                system_prompt="You extract structured knowledge graphs. Output ONLY valid JSON.",
+                cache_site="extraction",
+                priority=PRIORITY_BACKGROUND
             )
 
             data = json.loads(raw_result)
-            return NLPService._validate_and_clean(data)
+            return data if isinstance(data, dict) else {}
 
+        except RETRYABLE_ERRORS:
+            # Retries are exhausted: fail the job so RQ retries it later, rather than
+            # completing the document without this window's entities
+            logger.error("Extraction failed after retries; failing the job")
+            raise
         except Exception as e:
             logger.error(f"Error in NLP extraction: {e}")
-            return {"entities": [], "relationships": []}
+            return {}
+
+    @staticmethod
+    def _merge(partials: list[dict]) -> dict:
+        """Concatenates partial extractions and cleans them as one set."""
+        merged = {"entities": [], "relationships": []}
+
+        for part in partials:
+            for key in ("entities", "relationships"):
+                items = part.get(key, [])
+                if isinstance(items, list):
+                    merged[key].extend(items)
+
+        return NLPService._validate_and_clean(merged)
 
     @staticmethod
     def _validate_and_clean(data: dict) -> dict:
@@ -102,16 +203,22 @@ class NLPService:
             })
 
         relationships = data.get("relationships", [])
+        existing_rels = set()
 
         for rel in relationships if isinstance(relationships, list) else []:
             if not isinstance(rel, dict):
                 continue
 
-            source = normalize_entity(rel.get("source", ""))
-            target = normalize_entity(rel.get("target", ""))
+            source = normalize_entity(str(rel.get("source", "")))
+            target = normalize_entity(str(rel.get("target", "")))
             rel_type = str(rel.get("type", "")).strip().lower()
 
+            rel_key = (source, target, rel_type)
+            if rel_key in existing_rels:
+                continue
+
             if source in existing_entities and target in existing_entities:
+                existing_rels.add(rel_key)
                 clean_data["relationships"].append({
                     "source": source,
                     "target": target,
@@ -121,9 +228,8 @@ class NLPService:
         return clean_data
 
     @staticmethod
-    def generate_rag_response(query: str, context: str) -> str:
-
-        prompt = f"""
+    def _rag_prompt(query: str, context: str) -> str:
+        return f"""
         You are a precise AI assistant.
 
         Answer the question using ONLY the provided context.
@@ -151,7 +257,21 @@ class NLPService:
         ANSWER:
         """
 
-        return NLPService.generate_response(
-            prompt=prompt,
+    @staticmethod
+    async def agenerate_rag_response(query: str, context: str) -> str:
+        """Raises GenerationError when the LLM call fails."""
+        return await NLPService.agenerate_response(
+            prompt=NLPService._rag_prompt(query, context),
             system_prompt="You answer strictly from given context.",
-        )
\ No newline at end of file
+            cache_site="answer",
+            raise_on_error=True
+        )
+
+    @staticmethod
+    async def astream_rag_response(query: str, context: str):
+        """Yields answer tokens as the LLM produces them."""
+        async for token in llm_provider.astream_text(
+            prompt=NLPService._rag_prompt(query, context)[:12000],
+            system_prompt="You answer strictly from given context."
+        ):
+            yield token
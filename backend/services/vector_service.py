@@ -1,43 +1,101 @@
+import asyncio
+import time
+from typing import Iterable
+from core.compute import compute_pool, ComputeOverloaded
+from core.config import settings
 from infrastructure.embedding_provider import embedding_provider
 from infrastructure.supabase_adapter import supabase_adapter
+from utils.hashing import sha256_text
 import logging
 
 logger = logging.getLogger(__name__)
 
 class VectorService:
     @staticmethod
-    def embed_and_store_chunks(document_id: str, workspace_id: str, chunks: list[str]):
-        """Generates embeddings for a list of text chunks and stores them in pgvector."""
-        if not chunks:
-            return
-            
+    def embed_and_store_chunks(document_id: str, workspace_id: str, chunks: Iterable[dict], batch_size: int = None) -> int:
+        """
+        Generates embeddings for a stream of chunk dicts and stores them in pgvector.
+        Chunks are embedded and written in batches as they arrive, so embedding starts
+        before the whole document has been parsed. Writes are keyed by chunk index, so
+        re-running a document replaces its chunks. Returns the number of chunks stored.
+        """
+        batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+        stored = 0
+        start = time.perf_counter()
+
         try:
-            embeddings_vectors = embedding_provider.generate_embeddings(chunks)
-            
-            embeddings_data = []
-            for i, chunk in enumerate(chunks):
-                embeddings_data.append({
-                    "content": chunk,
-                    "embedding": embeddings_vectors[i]
-                })
-                
-            supabase_adapter.store_embeddings(document_id, workspace_id, embeddings_data)
+            batch = []
+            for chunk in chunks:
+                batch.append(chunk)
+                if len(batch) >= batch_size:
+                    stored += VectorService._embed_and_store_batch(document_id, workspace_id, batch)
+                    batch = []
+
+            if batch:
+                stored += VectorService._embed_and_store_batch(document_id, workspace_id, batch)
+
+            # Drop chunks a previous run of this document wrote past the current end, and
+            # any unindexed rows from runs before chunk_index existed
+            supabase_adapter.delete_embeddings_from(document_id, stored)
+            supabase_adapter.delete_legacy_embeddings(document_id)
         except Exception as e:
             logger.error(f"Failed to embed and store chunks: {e}")
             raise e
 
+        elapsed = time.perf_counter() - start
+        logger.info(f"Embedded and stored {stored} chunks in {elapsed:.1f}s ({stored / elapsed if elapsed else 0:.0f} rows/s)")
+        return stored
+
+    @staticmethod
+    def _embed_and_store_batch(document_id: str, workspace_id: str, batch: list[dict]) -> int:
+        hashes = [c.get("content_hash") or sha256_text(c["content"]) for c in batch]
+
+        # Reuse vectors for chunks this workspace has already embedded
+        known = supabase_adapter.get_embeddings_by_hash(workspace_id, list(set(hashes)))
+
+        misses = {}
+        for chunk, content_hash in zip(batch, hashes):
+            if content_hash not in known:
+                misses.setdefault(content_hash, chunk["content"])
+
+        if misses:
+            new_vectors = embedding_provider.generate_embeddings(list(misses.values()))
+            known.update(zip(misses.keys(), new_vectors))
+
+        logger.info(f"Embedding batch: {len(batch) - len(misses)} reused, {len(misses)} computed")
+
+        embeddings_data = []
+        for chunk, content_hash in zip(batch, hashes):
+            embeddings_data.append({
+                "content": chunk["content"],
+                "chunk_index": chunk["chunk_index"],
+                "page": chunk.get("page"),
+                "content_hash": content_hash,
+                "embedding": known[content_hash]
+            })
+
+        supabase_adapter.store_embeddings(document_id, workspace_id, embeddings_data)
+        return len(batch)
+
     @staticmethod
-    def retrieve_similar_chunks(workspace_id: str, query: str, limit: int = 10) -> list[str]:
-        """Gets vector representations for the query and searches pgvector."""
+    def delete_document_chunks(document_id: str) -> int:
+        return supabase_adapter.delete_document_embeddings(document_id)
+
+    @staticmethod
+    async def aretrieve_similar_chunks(workspace_id: str, query: str, limit: int = 10) -> list[str]:
+        """Searches pgvector for the query; embedding runs on the bounded compute pool. Errors propagate."""
         try:
-            query_embedding = embedding_provider.generate_query_embedding(query)
-            matches = supabase_adapter.query_embeddings(workspace_id, query_embedding, limit)
-            
+            query_embedding = await compute_pool.run(embedding_provider.generate_query_embedding, query)
+            matches = await asyncio.to_thread(supabase_adapter.query_embeddings, workspace_id, query_embedding, limit)
+
             logger.info(f"Found {len(matches)} similar chunks")
             if not matches:
                 return []
-            
+
             return [match["content"] for match in matches]
+        except ComputeOverloaded:
+            raise
         except Exception as e:
+            # Raised so the query graph can tell a failed lookup from an empty one
             logger.error(f"Failed to retrieve similar chunks: {e}")
-            return []
+            raise
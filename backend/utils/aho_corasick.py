@@ -0,0 +1,73 @@
+from collections import deque
+
+
+class AhoCorasick:
+    """
+    Multi-pattern string matcher: finds every occurrence of every pattern in a single
+    pass over the text. Patterns can be added after a search; the failure links are
+    rebuilt lazily on the next search, which only walks the in-memory trie.
+    """
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        self.patterns = 0
+        self._dirty = False
+
+    def __len__(self):
+        return self.patterns
+
+    def add(self, pattern: str, value=None):
+        if not pattern:
+            return
+        node = 0
+        for ch in pattern:
+            nxt = self.goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            node = nxt
+
+        entry = (len(pattern), pattern if value is None else value)
+        if entry not in self.output[node]:
+            self.output[node].append(entry)
+            self.patterns += 1
+        self._dirty = True
+
+    def _build(self):
+        queue = deque()
+        for child in self.goto[0].values():
+            self.fail[child] = 0
+            queue.append(child)
+
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[child] = self.goto[f].get(ch, 0)
+
+        self._dirty = False
+
+    def iter(self, text: str):
+        """Yields (start, end, value) for every match; `end` is exclusive."""
+        if self._dirty:
+            self._build()
+
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+
+            out = node
+            while out:
+                for length, value in self.output[out]:
+                    yield i + 1 - length, i + 1, value
+                out = self.fail[out]
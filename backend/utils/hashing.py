@@ -0,0 +1,30 @@
+import hashlib
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+def sha256_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def sha256_file(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+async def sha256_upload(upload, max_bytes: int) -> str:
+    """
+    Reads a FastAPI UploadFile in chunks with async reads and returns its SHA-256.
+    Raises ValueError once more than `max_bytes` have been read.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        block = await upload.read(HASH_BLOCK_SIZE)
+        if not block:
+            break
+        size += len(block)
+        if size > max_bytes:
+            raise ValueError(f"File too large (max {max_bytes} bytes)")
+        digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,16 @@
+import base64
+import json
+
+
+def encode_cursor(key) -> str:
+    """Opaque, URL-safe cursor for a keyset pagination key."""
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Inverse of `encode_cursor`. Raises ValueError on a malformed cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
@@ -7,4 +7,9 @@ def normalize_entity(entity: str) -> str:
     entity = entity.lower().strip()
     entity = re.sub(r'[^a-z0-9\s]', '', entity)  # remove punctuation
     entity = lemmatizer.lemmatize(entity)        # singularize
-    return entity
\ No newline at end of file
+    return entity
+
+def normalize_text(text: str) -> str:
+    """Lower-cases, replaces punctuation with spaces and lemmatizes word by word."""
+    text = re.sub(r'[^a-z0-9\s]', ' ', text.lower())
+    return " ".join(lemmatizer.lemmatize(token) for token in text.split())
@@ -1,6 +1,8 @@
+import argparse
 import sys
+import time
 import logging
-from rq import Worker
+from rq import Worker, SimpleWorker
 from infrastructure.redis_adapter import redis_adapter
 from core.config import settings
 
@@ -11,15 +13,44 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# plain:   forking worker, every work horse imports the pipeline and loads the models itself
+# preload: models and ingestion graph are loaded once in the parent and inherited by each fork
+# pool:    long-lived non-forking workers (one per process) supervised by an RQ WorkerPool,
+#          which restarts any worker process that crashes
+WORKER_MODES = ("plain", "preload", "pool")
 
-def start_worker():
+
+def preload_models():
+    """Imports the task module, which loads the embedding model and compiles the ingestion graph."""
+    start = time.perf_counter()
+    import workers.tasks  # noqa: F401
+    elapsed = time.perf_counter() - start
+    logger.info(f"Models and ingestion graph loaded in {elapsed:.2f}s")
+
+
+def start_worker(mode: str = "preload", num_workers: int = 2):
     """Starts the RQ worker process"""
     if not redis_adapter.redis_conn:
         logger.error("Redis connection failed. Cannot start worker.")
         sys.exit(1)
 
     queues = ["default"]
-    logger.info("Initializing RQ worker. Listening on 'default' queue...")
+    logger.info(f"Initializing RQ worker in '{mode}' mode. Listening on 'default' queue...")
+
+    if mode != "plain":
+        preload_models()
+
+    if mode == "pool":
+        from rq.worker_pool import WorkerPool
+
+        pool = WorkerPool(
+            queues,
+            connection=redis_adapter.redis_conn,
+            num_workers=num_workers,
+            worker_class=SimpleWorker
+        )
+        pool.start()
+        return
 
     worker = Worker(
         queues=queues,
@@ -30,4 +61,9 @@ def start_worker():
 
 
 if __name__ == "__main__":
-    start_worker()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="KGBuilder RQ worker")
+    parser.add_argument("--mode", choices=WORKER_MODES, default=settings.WORKER_MODE)
+    parser.add_argument("--workers", type=int, default=settings.WORKER_POOL_SIZE, help="Worker processes in 'pool' mode")
+    args = parser.parse_args()
+
+    start_worker(args.mode, args.workers)
@@ -0,0 +1,31 @@
+import argparse
+import logging
+from infrastructure.supabase_adapter import supabase_adapter
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+def purge_duplicate_chunks(workspace_id: str = None) -> int:
+    """Removes duplicate document_embeddings rows left by re-run ingestion jobs."""
+    scope = f"workspace {workspace_id}" if workspace_id else "all workspaces"
+    logger.info(f"Purging duplicate chunks in {scope}...")
+    removed = supabase_adapter.purge_duplicate_embeddings(workspace_id)
+    logger.info(f"Removed {removed} duplicate chunks from {scope}")
+    return removed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="KGBuilder maintenance tasks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    purge = subparsers.add_parser("purge-duplicates", help="Delete duplicate chunks in document_embeddings")
+    purge.add_argument("--workspace", default=None, help="Limit to one workspace id")
+
+    args = parser.parse_args()
+
+    if args.command == "purge-duplicates":
+        purge_duplicate_chunks(args.workspace)
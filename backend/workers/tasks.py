@@ -1,15 +1,41 @@
 import logging
 import traceback
+from rq import get_current_job
 from infrastructure.supabase_adapter import supabase_adapter
-from infrastructure.neo4j_adapter import neo4j_adapter
+from infrastructure.answer_cache import invalidate_answers
 from langgraph.ingestion_graph import ingestion_pipeline
+from services.document_service import DocumentService
+from services.graph_service import GraphService
+from services.vector_service import VectorService
 
 logger = logging.getLogger(__name__)
 
-def process_document_task(job_id: str, workspace_id: str, user_id: str, document_id: str, storage_path: str, ext: str):
+def remove_document_data(workspace_id: str, document_id: str) -> dict:
+    """Removes a document's chunks and the graph elements only it contributed."""
+    removed = GraphService.remove_document(workspace_id, document_id)
+    removed["chunks_deleted"] = VectorService.delete_document_chunks(document_id)
+    logger.info(f"Removed data for document {document_id}: {removed}")
+    return removed
+
+def sync_entity_count(workspace_id: str, user_id: str):
+    """
+    Sets the workspace's entity_count from the graph itself. Unlike a delta from one attempt's
+    write counters, the count stays right when a job is retried after a partial write.
+    """
+    supabase_adapter.set_workspace_entity_count(workspace_id, user_id, GraphService.count_entities(workspace_id))
+
+def _will_retry() -> bool:
+    """True when RQ will run the current job again after this attempt fails."""
+    job = get_current_job()
+    return bool(job and job.retries_left)
+
+def process_document_task(job_id: str, workspace_id: str, user_id: str, document_id: str, storage_path: str, ext: str, replace: bool = False, count_document: bool = False):
     """
     Background job to process an uploaded document asynchronously.
     Executes LangGraph ingestion pipeline.
+    With `replace`, the document's previous chunks and graph contribution are removed first.
+    A replaced document is already in the workspace's doc_count unless `count_document` is set,
+    as it is when its previous version never completed.
     """
     logger.info(f"Starting job {job_id} for document {document_id}")
     
@@ -20,38 +46,51 @@ def process_document_task(job_id: str, workspace_id: str, user_id: str, document
         logger.error(f"Failed to update document status to processing: {e}")
         # Continue execution anyway, but log
         
+    doc_delta = 1 if count_document or not replace else 0
+
     try:
+        # Replacing a document: drop what the previous version contributed
+        if replace:
+            remove_document_data(workspace_id, document_id)
+
         # 2. Prepare state for LangGraph
         initial_state = {
             "workspace_id": workspace_id,
             "document_id": document_id,
             "storage_path": storage_path,
             "ext": ext,
-            "text": None,
-            "chunks": None,
-            "extraction": None
+            "local_path": None,
+            "duplicate_of": None,
+            "extraction": None,
+            "chunks_stored": None,
+            "entities_created": None
         }
         
         # 3. Run Pipeline
         final_state = ingestion_pipeline.invoke(initial_state)
+
+        # Identical content is already in the workspace graph and vector store
+        if final_state.get("duplicate_of"):
+            if replace:
+                invalidate_answers(workspace_id)
+            if doc_delta:
+                supabase_adapter.increment_workspace_stats(workspace_id, user_id, doc_delta=doc_delta)
+            if replace:
+                sync_entity_count(workspace_id, user_id)
+            # Recorded so the document is re-ingested if the original is deleted or replaced
+            supabase_adapter.update_document(document_id, {
+                "status": "completed", "duplicate_of": final_state["duplicate_of"]
+            })
+            logger.info(f"Document {document_id} is a duplicate of {final_state['duplicate_of']}, nothing to ingest")
+            return
         
-        # 4. Update Workspace stats
-        workspace = supabase_adapter.get_workspace(workspace_id, user_id)
-        if workspace:
-            current_doc_count = workspace.get("doc_count", 0)
-            
-            # Recalculate entity count via Graph
-            graph_data = neo4j_adapter.get_workspace_graph(workspace_id)
-            new_entity_count = len(graph_data["nodes"]) if graph_data else 0
+        # 4. Update Workspace stats: doc_count atomically, entity_count from the graph
+        if doc_delta:
+            supabase_adapter.increment_workspace_stats(workspace_id, user_id, doc_delta=doc_delta)
+        sync_entity_count(workspace_id, user_id)
             
-            supabase_adapter.update_workspace_stats(
-                workspace_id, 
-                user_id, 
-                current_doc_count + 1, 
-                new_entity_count
-            )
-            
-        # 5. Mark as completed
+        # 5. Mark as completed; cached answers no longer reflect the workspace
+        invalidate_answers(workspace_id)
         supabase_adapter.update_document_job(document_id, status="completed")
         logger.info(f"Successfully processed document {document_id}")
 
@@ -59,13 +98,18 @@ def process_document_task(job_id: str, workspace_id: str, user_id: str, document
         error_trace = traceback.format_exc()
         logger.error(f"Job {job_id} failed for document {document_id}: {error_trace}")
         
-        # Mark as failed
+        # Mark as failed, unless a retry is scheduled: a queued document cannot be deleted
+        # or replaced, so the retry never writes data for a document that is gone
         try:
             # Optionally just save `str(e)` if trace is too long
             error_message = str(e)[:500] 
-            supabase_adapter.update_document_job(document_id, status="failed", error=error_message)
+            status = "queued" if _will_retry() else "failed"
+            supabase_adapter.update_document_job(document_id, status=status, error=error_message)
         except Exception as inner_e:
             logger.error(f"Failed to save error status for {document_id}: {inner_e}")
             
         # Re-raise so RQ knows it failed and can apply retries
         raise e
+
+    finally:
+        DocumentService.remove_local_file(document_id, ext)